@@ -0,0 +1,166 @@
+"""Cross-worker fan-out for messages addressed to a user.
+
+A user's sockets can be spread over several workers and pods. Each worker
+delivers to its own sockets directly and publishes the message so every other
+worker can deliver to theirs. ``InProcessBroker`` connects brokers living in
+the same process (a stand-in for tests and single-worker runs);
+``PostgresBroker`` uses LISTEN/NOTIFY on the application database, so no
+extra infrastructure is needed. If its LISTEN connection drops it reconnects
+with backoff; messages published meanwhile are not replayed, and ``error``
+(reported by ``/ready``) says why the broker is down.
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, List, Optional
+
+from psycopg import AsyncConnection, OperationalError
+from psycopg_pool import AsyncConnectionPool
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Deliver = Callable[[str, str], Awaitable[None]]
+
+CHANNEL = "chat_broadcast"
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+MAX_PAYLOAD = 7900
+RECONNECT_MIN_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30.0
+
+
+class Broker(ABC):
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex
+        self._deliver: Optional[Deliver] = None
+        # Set while other workers' messages cannot be received
+        self.error: Optional[str] = None
+
+    async def start(self, deliver: Deliver):
+        """Start receiving; ``deliver(user_id, message)`` is called for other workers' messages."""
+        self._deliver = deliver
+
+    @abstractmethod
+    async def publish(self, user_id: str, message: str):
+        """Send ``message`` to the sockets of ``user_id`` held by other workers."""
+
+    async def stop(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": type(self).__name__, "error": self.error}
+
+    async def _receive(self, user_id: str, message: str):
+        try:
+            await self._deliver(user_id, message)
+        except Exception:
+            logger.exception(f"Broadcast delivery to {user_id} failed")
+
+
+class InProcessHub:
+    def __init__(self):
+        self.brokers: List["InProcessBroker"] = []
+
+
+class InProcessBroker(Broker):
+    def __init__(self, hub: Optional[InProcessHub] = None):
+        super().__init__()
+        self.hub = hub or InProcessHub()
+
+    async def start(self, deliver: Deliver):
+        await super().start(deliver)
+        self.hub.brokers.append(self)
+
+    async def publish(self, user_id: str, message: str):
+        for broker in list(self.hub.brokers):
+            if broker is not self:
+                await broker._receive(user_id, message)
+
+    async def stop(self):
+        if self in self.hub.brokers:
+            self.hub.brokers.remove(self)
+
+
+class PostgresBroker(Broker):
+    def __init__(self, pool: AsyncConnectionPool, conninfo: str):
+        super().__init__()
+        self.pool = pool
+        self.conninfo = conninfo
+        self._conn: Optional[AsyncConnection] = None
+        self._listener: Optional[asyncio.Task] = None
+        self.reconnects = 0
+
+    async def start(self, deliver: Deliver):
+        await super().start(deliver)
+        await self._connect()
+        self._listener = asyncio.create_task(self._listen())
+
+    async def _connect(self):
+        # LISTEN needs a connection of its own for the life of the worker
+        self._conn = await AsyncConnection.connect(self.conninfo, autocommit=True)
+        await self._conn.execute(f"LISTEN {CHANNEL}")
+        self.error = None
+
+    async def _listen(self):
+        delay = RECONNECT_MIN_DELAY
+        while True:
+            try:
+                if self._conn is None:
+                    await self._connect()
+                    self.reconnects += 1
+                    delay = RECONNECT_MIN_DELAY
+                    logger.info("Broadcast listener reconnected")
+                async for notify in self._conn.notifies():
+                    await self._handle(notify.payload)
+                raise OperationalError("LISTEN connection closed")
+            except OperationalError as e:
+                self.error = str(e) or type(e).__name__
+                logger.error(f"Broadcast listener lost its connection ({e!r}), retrying in {delay:.1f}s")
+                await self._discard_connection()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def _handle(self, raw: str):
+        # One bad notification must never stop the listener
+        try:
+            payload = json.loads(raw)
+            if payload.get("origin") != self.worker_id:
+                await self._receive(payload["user_id"], payload["message"])
+        except Exception:
+            logger.exception(f"Ignoring malformed broadcast: {raw[:200]!r}")
+
+    async def _discard_connection(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                await conn.close()
+            except Exception:
+                pass
+
+    async def publish(self, user_id: str, message: str):
+        payload = json.dumps(
+            {"origin": self.worker_id, "user_id": user_id, "message": message}
+        )
+        if len(payload.encode()) > MAX_PAYLOAD:
+            logger.warning(f"Broadcast to {user_id} too large for NOTIFY, delivered locally only")
+            return
+        async with self.pool.connection() as conn:
+            await conn.execute("SELECT pg_notify(%s, %s)", (CHANNEL, payload))
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+        await self._discard_connection()
+
+    def stats(self) -> dict:
+        return {**super().stats(), "reconnects": self.reconnects}
+
+
+def create_broker(pool: Optional[AsyncConnectionPool] = None) -> Broker:
+    if settings.COORDINATION_BACKEND == "postgres":
+        return PostgresBroker(pool, settings.DATABASE_URL)
+    return InProcessBroker()
@@ -1,124 +1,138 @@
+import json
 import logging
-import os
 import re
+from typing import List, Optional
 
-from dotenv import load_dotenv
-from langchain.chat_models import init_chat_model
-from langchain_core.messages import AIMessage, HumanMessage
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.messages import AIMessage, AnyMessage
 from langchain_core.runnables import RunnableConfig
-from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
-from langgraph.graph import START, MessagesState, StateGraph
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.state import CompiledStateGraph
 from langgraph.store.base import BaseStore
-from langgraph.store.postgres.aio import AsyncPostgresStore
 
+from app.core.chatbot.memory import (
+    get_cursor,
+    get_memory,
+    merge_memories,
+    save_cursor,
+    save_memory,
+    search_memories,
+)
 from app.core.chatbot.models import MessageRequest
-from app.utils.model import chat_model
-from app.utils.sys_prompt import SYSTEM_PROMPT
+from app.core.chatbot.prompts import prompt_assembler
+from app.core.chatbot.response_cache import response_cache
+from app.core.chatbot.state import ChatState
+from app.core.chatbot.summary import format_history
+from app.core.config import settings
+from app.core.lifecycle import lifecycle
+from app.core.llm import BACKGROUND, llm
+from app.core.metrics import stage, trace_turn
+from app.core.sessions import thread_locks
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-# Load environment variables
-load_dotenv()
-
-grok_api_key = os.getenv("GROQ_API_KEY")
-db_url = os.getenv("DATABASE_URL")
-DB_URI = os.getenv("DATABASE_URL")
-
-
-def chat_model():
-    model = init_chat_model(
-        "meta-llama/llama-4-scout-17b-16e-instruct",
-        model_provider="groq",
-        api_key=grok_api_key,
-    )  # / llama3-8b-8192
-    return model
-
-
-model = chat_model()
-# store = PostgresStore.from_conn_string(db_url)
-# checkpointer = PostgresSaver.from_conn_string(db_url)
-
-
-def create_prompt_template(SYSTEM_PROMPT) -> ChatPromptTemplate:
-    return ChatPromptTemplate.from_messages(
-        [
-            ("system", SYSTEM_PROMPT),
-            MessagesPlaceholder(variable_name="messages"),
-        ]
-    )
-
-
 async def call_model(
-    state: MessagesState,
+    state: ChatState,
     config: RunnableConfig,
     *,
     store: BaseStore,
 ):
     user_id = config["configurable"]["user_id"]
-    namespace = ("memories", user_id)
-    memories = await store.asearch(namespace, query=str(state["messages"][-1].content))
-    info = "\n".join([d.value["data"] for d in memories])
-
-    system_msg = SYSTEM_PROMPT.format(info=info)
-    prompt = await create_prompt_template(system_msg).ainvoke(state)
-
-    # print(f"STATE-MESSAGES: {state['messages']}")
-    # print(f"type_state: {type(state)}")
-    # print(f"STATE: {state}")
-
-    """response = await model.ainvoke(
-        [{"role": "system", "content": system_msg}] + state["messages"]
-    )"""
-
-    response = await model.ainvoke(prompt)
-    # print(f"RESPONSE: {response}")
-    return {"messages": response.content}
-
-
-async def main(config, input: MessageRequest):
-    async with (
-        AsyncPostgresStore.from_conn_string(DB_URI) as store,
-        AsyncPostgresSaver.from_conn_string(DB_URI) as checkpointer,
-    ):
-        # await store.setup()
-        # await checkpointer.setup()
-
-        builder = StateGraph(MessagesState)
-        builder.add_node(call_model)
-        builder.add_edge(START, "call_model")
-
-        graph = builder.compile(
-            checkpointer=checkpointer,
-            store=store,
+    user_text = str(state["messages"][-1].content)
+    with stage("memory_search"):
+        memories = await search_memories(store, user_id, query=user_text)
+
+    # Opening turns without memories only depend on the message itself
+    cacheable = (
+        response_cache.enabled
+        and not memories
+        and len(state["messages"]) == 1
+        and not state.get("summary")
+    )
+    if cacheable:
+        with stage("response_cache"):
+            cached = await response_cache.lookup(user_text)
+        if cached is not None:
+            return {"messages": AIMessage(content=cached)}
+
+    with stage("prompt"):
+        prompt = prompt_assembler.assemble(
+            user_id, memories, state["messages"], state.get("summary")
         )
 
-        user_input = input
-
-        while True:
+    # Keep the full AIMessage so usage metadata survives into the state and
+    # token chunks are emitted when the graph runs with stream_mode="messages".
+    # Streaming turns are not hedged, retried or sent to the fallback model
+    # once the client has seen tokens.
+    stream = bool(config["configurable"].get("stream"))
+    with stage("llm"):
+        response = await llm.ainvoke(prompt, user_id=user_id, hedge=not stream, stream=stream)
+    if cacheable:
+        await response_cache.store(user_text, response.content)
+    return {"messages": response}
+
+
+def build_graph(checkpointer: BaseCheckpointSaver, store: BaseStore) -> CompiledStateGraph:
+    """Compile the chat graph; called once at startup and shared by every session."""
+    builder = StateGraph(ChatState)
+    builder.add_node("call_model", call_model)
+    builder.add_edge(START, "call_model")
+    builder.add_edge("call_model", END)
+
+    return builder.compile(checkpointer=checkpointer, store=store)
+
+
+async def main(graph: CompiledStateGraph, config, input: MessageRequest):
+    response = ""
+    configurable = config["configurable"]
+    async with lifecycle.turn(), thread_locks.hold(configurable["thread_id"]):
+        with trace_turn("rest", configurable["user_id"], configurable["thread_id"]):
             async for chunk in graph.astream(
-                {"messages": [{"role": "user", "content": user_input}]},
+                {"messages": [{"role": "user", "content": input.message}]},
                 config,
                 stream_mode="values",
             ):
-                return chunk["messages"][-1].content
+                response = chunk["messages"][-1].content
 
-            user_input = input
+    return response
 
 
 # save the relevant message to long-term memory
 
 
-async def update_memory(state: MessagesState, config: RunnableConfig, store: BaseStore):
+def split_unprocessed(messages: List[AnyMessage], cursor: Optional[str]):
+    """Split ``messages`` into (context, new) around the extraction cursor.
 
-    conv_history = []
-    for message in state["messages"]:
-        if isinstance(message, HumanMessage):
-            conv_history.append({"User": message.content})
-        elif isinstance(message, AIMessage):
-            conv_history.append({"Chatbot": message.content})
+    ``new`` is everything after the message with id ``cursor``; ``context`` is
+    the last few already processed messages before it. If the cursor is unknown
+    (first extraction, or the message has since been trimmed) everything is new.
+    """
+    start = 0
+    if cursor is not None:
+        for index, message in enumerate(messages):
+            if message.id == cursor:
+                start = index + 1
+                break
+    window = settings.MEMORY_CONTEXT_MESSAGES
+    return messages[max(0, start - window) : start], messages[start:]
+
+
+async def update_memory(state: ChatState, config: RunnableConfig, store: BaseStore):
+    """Extract long-term memory from the messages added since the last run.
+
+    The cursor is read from and saved to the store next to the thread's
+    memory. Returns the id of the newest message processed; ``None`` if there
+    was nothing new.
+    """
+    user_id = config["configurable"]["user_id"]
+    thread_id = config["configurable"]["thread_id"]
+    # Threads from before the cursor moved to the store still carry it in state
+    cursor = await get_cursor(store, user_id, thread_id) or state.get("memory_cursor")
+    context, new_messages = split_unprocessed(state["messages"], cursor)
+    if not new_messages:
+        return None
 
     prompt = f"""In a conversation between a human and an AI chatbot designed to help improve the user's mental health, the human has sent the following message. Examine the content to determine if it is significant enough to be saved in the chatbot's long-term memory for future reference, particularly to improve context for both current and future conversations.
 
@@ -170,27 +184,41 @@ async def update_memory(state: MessagesState, config: RunnableConfig, store: Bas
  
     """
 
-    important = await model.ainvoke(prompt + str(conv_history))
-    if important.content.strip() != "":
-
-        # Get the user id from the config
-        user_id = config["configurable"]["user_id"]
+    cursor = new_messages[-1].id
+    conv_history = format_history(new_messages)
+    if context:
+        conv_history = {
+            "Earlier messages (context only)": format_history(context),
+            "New messages": conv_history,
+        }
+
+    with stage("memory_extract"):
+        important = await llm.ainvoke(
+            prompt + str(conv_history),
+            user_id=user_id,
+            priority=BACKGROUND,
+        )
 
-        # Namespace the memory
-        namespace = (user_id, "memories")
+    # extract the json from the response
+    found = re.search(r"\{.*\}", important.content, re.DOTALL)
+    try:
+        extracted = json.loads(found.group()) if found else {}
+    except ValueError:
+        logger.warning(f"Could not parse memory extraction output: {important.content}")
+        extracted = {}
 
-        # ... Analyze conversation and create a new memory
+    if extracted:
 
-        # Create a new memory ID
-        memory_id = config["configurable"]["thread_id"]  # str(uuid.uuid4())
+        # One memory document per thread, merged across extractions
+        memory_id = thread_id  # str(uuid.uuid4())
 
-        # extract the json from the response
-        cleaned = re.search(r"\{.*\}", important.content, re.DOTALL).group()
-        # We create a new memory
-        await store.aput(namespace, memory_id, cleaned)
-        logger.info(f"Message saved in long-term memory: {cleaned} ")
-        return memory_id
+        with stage("memory_save"):
+            merged = merge_memories(await get_memory(store, user_id, memory_id), extracted)
+            await save_memory(store, user_id, memory_id, merged)
+        logger.info(f"Message saved in long-term memory: {extracted} ")
     else:
         # If the message is not important, we do nothing
         logger.info("no Message important enough to be saved in long-term memory.")
-        pass
+
+    await save_cursor(store, user_id, thread_id, cursor)
+    return cursor
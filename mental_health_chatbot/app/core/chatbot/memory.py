@@ -0,0 +1,135 @@
+"""Long-term memory: namespace scheme, storage format and retrieval.
+
+Every read and write of user memories goes through this module so the
+namespace and value shape cannot drift apart again. Memories live under
+``("memories", user_id)``, one item per thread, as ``{"data": <json>}``. The
+``data`` field is embedded into a pgvector HNSW index so ``search_memories``
+ranks by similarity instead of scanning the user's namespace.
+
+The extraction cursor of each thread is kept beside it under
+``("memory_cursors", user_id)``, unindexed, so advancing it is a small store
+write rather than a new checkpoint.
+"""
+
+import json
+import logging
+from typing import List, Optional
+
+from langgraph.store.base import BaseStore, Item
+from langgraph.store.postgres.base import PostgresIndexConfig
+
+from app.core.chatbot.memory_cache import memory_cache
+from app.core.config import settings
+from app.core.embeddings import embedding_service
+
+logger = logging.getLogger(__name__)
+
+MEMORY_PREFIX = "memories"
+CURSOR_PREFIX = "memory_cursors"
+
+
+def memory_namespace(user_id: str) -> tuple:
+    return (MEMORY_PREFIX, user_id)
+
+
+def cursor_namespace(user_id: str) -> tuple:
+    return (CURSOR_PREFIX, user_id)
+
+
+def memory_index_config() -> PostgresIndexConfig:
+    """Index config for ``AsyncPostgresStore``: embed ``value["data"]`` into an HNSW index."""
+    return {
+        "dims": settings.EMBEDDING_DIMS,
+        "embed": embedding_service,
+        "fields": ["data"],
+        "ann_index_config": {"kind": "hnsw"},
+        "distance_type": "cosine",
+    }
+
+
+def load_memory(value) -> dict:
+    # Older rows stored the raw JSON string instead of {"data": ...}
+    data = value.get("data", "{}") if isinstance(value, dict) else value
+    try:
+        loaded = json.loads(data)
+    except (TypeError, ValueError):
+        return {}
+    return loaded if isinstance(loaded, dict) else {}
+
+
+def merge_memories(existing: dict, new: dict) -> dict:
+    """Fold newly extracted keys into the stored memory.
+
+    Nested objects are merged recursively, lists are unioned and any other
+    value is replaced by the newer one.
+    """
+    merged = dict(existing)
+    for key, value in new.items():
+        old = merged.get(key)
+        if isinstance(old, dict) and isinstance(value, dict):
+            merged[key] = merge_memories(old, value)
+        elif isinstance(old, list) or (old is not None and isinstance(value, list)):
+            items = old if isinstance(old, list) else [old]
+            for item in value if isinstance(value, list) else [value]:
+                if item not in items:
+                    items = items + [item]
+            merged[key] = items
+        else:
+            merged[key] = value
+    return merged
+
+
+async def get_memory(store: BaseStore, user_id: str, key: str) -> dict:
+    item = await store.aget(memory_namespace(user_id), key)
+    return load_memory(item.value) if item else {}
+
+
+async def save_memory(store: BaseStore, user_id: str, key: str, memory: dict):
+    namespace = memory_namespace(user_id)
+    await store.aput(namespace, key, {"data": json.dumps(memory)})
+    memory_cache.invalidate(namespace)
+
+
+async def get_cursor(store: BaseStore, user_id: str, thread_id: str) -> Optional[str]:
+    item = await store.aget(cursor_namespace(user_id), thread_id)
+    return item.value.get("cursor") if item else None
+
+
+async def save_cursor(store: BaseStore, user_id: str, thread_id: str, cursor: str):
+    await store.aput(cursor_namespace(user_id), thread_id, {"cursor": cursor}, index=False)
+
+
+async def search_memories(store: BaseStore, user_id: str, query: str) -> List[Item]:
+    """Top-k memories for ``query``, dropping results below ``MEMORY_MIN_SCORE``.
+
+    Users with no more than ``MEMORY_TOP_K`` memories get all of them from a
+    cached namespace listing, since ranking would return the same set; only
+    larger namespaces go to the vector index.
+    """
+    namespace = memory_namespace(user_id)
+    top_k = settings.MEMORY_TOP_K
+
+    # Taken before any store read: a save during the read makes it stale
+    generation = memory_cache.generation(namespace)
+    listing = memory_cache.get(namespace)
+    if listing is None:
+        listing = await store.asearch(namespace, limit=top_k + 1)
+        memory_cache.set(namespace, "", listing, generation)
+    if len(listing) <= top_k:
+        return listing
+
+    key = " ".join(query.lower().split())
+    results = memory_cache.get(namespace, key)
+    if results is None:
+        results = await store.asearch(namespace, query=query, limit=top_k)
+        results = [
+            item
+            for item in results
+            if item.score is None or item.score >= settings.MEMORY_MIN_SCORE
+        ]
+        memory_cache.set(namespace, key, results, generation)
+    return results
+
+
+def format_memories(items: List[Item]) -> str:
+    return "\n".join(item.value["data"] for item in items if "data" in item.value)
@@ -0,0 +1,118 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from langgraph.store.base import Item
+
+from app.core.config import settings
+
+# Rough per-entry bookkeeping cost added to the size of the cached values
+ENTRY_OVERHEAD = 256
+
+
+class MemoryCache:
+    """In-process LRU/TTL cache of memory search results.
+
+    Entries are grouped by store namespace so a write to a namespace can drop
+    every cached result for it at once. The cache is bounded by an estimate of
+    the bytes held (the JSON size of the cached values) rather than by entry
+    count, because a few heavy users can hold far more memory than the rest.
+
+    Each namespace has a generation, bumped by every invalidation. A reader
+    takes ``generation()`` before querying the store and passes it to
+    ``set()``, so a result read before a concurrent write is not cached
+    after that write invalidated the namespace.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # (namespace, key) -> (expires_at, size, items), least recently used first
+        self._entries: "OrderedDict[Tuple[tuple, str], Tuple[float, int, List[Item]]]" = (
+            OrderedDict()
+        )
+        self._keys: Dict[tuple, Set[str]] = {}
+        # namespace -> number of invalidations; one int per namespace ever written
+        self._generations: Dict[tuple, int] = {}
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale = 0
+
+    def generation(self, namespace: tuple) -> int:
+        return self._generations.get(namespace, 0)
+
+    def get(self, namespace: tuple, key: str = "") -> Optional[List[Item]]:
+        entry = self._entries.get((namespace, key))
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[0] < time.monotonic():
+            self._remove((namespace, key))
+            self.misses += 1
+            return None
+        self._entries.move_to_end((namespace, key))
+        self.hits += 1
+        return entry[2]
+
+    def set(
+        self, namespace: tuple, key: str, items: List[Item], generation: Optional[int] = None
+    ):
+        if generation is not None and generation != self.generation(namespace):
+            # Invalidated while the caller was reading the store
+            self.stale += 1
+            return
+        size = ENTRY_OVERHEAD + sum(
+            len(json.dumps(item.value, default=str)) for item in items
+        )
+        if size > self.max_bytes:
+            return
+        if (namespace, key) in self._entries:
+            self._remove((namespace, key))
+
+        self._entries[(namespace, key)] = (time.monotonic() + self.ttl, size, items)
+        self._keys.setdefault(namespace, set()).add(key)
+        self.bytes += size
+
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, namespace: tuple):
+        """Drop every cached result for ``namespace``; call after writing to it."""
+        for key in list(self._keys.get(namespace, ())):
+            self._remove((namespace, key))
+        self._generations[namespace] = self.generation(namespace) + 1
+        self.invalidations += 1
+
+    def _remove(self, cache_key: Tuple[tuple, str]):
+        _, size, _ = self._entries.pop(cache_key)
+        self.bytes -= size
+        namespace, key = cache_key
+        keys = self._keys[namespace]
+        keys.discard(key)
+        if not keys:
+            del self._keys[namespace]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "stale": self.stale,
+        }
+
+
+memory_cache = MemoryCache(
+    max_bytes=settings.MEMORY_CACHE_MAX_BYTES, ttl=settings.MEMORY_CACHE_TTL
+)
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph.state import CompiledStateGraph
+
+from app.core.chatbot.chatbot_workflow import update_memory
+from app.core.chatbot.summary import summarize_conversation
+from app.core.config import settings
+from app.core.sessions import thread_locks
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryExtractionQueue:
+    """Bounded queue of threads waiting for long-term memory extraction.
+
+    Turns only *submit* their thread; a pool of worker tasks later loads the
+    latest checkpointed state, runs ``update_memory`` on the messages added
+    since the thread's extraction cursor (kept in the store) and folds an
+    over-budget history into the running summary; only a summary change
+    writes a checkpoint. A thread that is already
+    waiting is not queued twice, so several quick turns on the same thread
+    collapse into a single extraction call. A thread is never processed by
+    two workers at once: a submit while it runs marks it dirty, and it is
+    queued again once the current run is done.
+    """
+
+    def __init__(self, maxsize: int, workers: int):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self._pending: Dict[str, Tuple[RunnableConfig, float]] = {}
+        # Threads being processed, and those submitted again meanwhile
+        self._active: Set[str] = set()
+        self._dirty: Dict[str, Tuple[RunnableConfig, float]] = {}
+        self._num_workers = workers
+        self._workers: List[asyncio.Task] = []
+        self._graph: Optional[CompiledStateGraph] = None
+
+        self.submitted = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.processed = 0
+        self.summarized = 0
+        self.failed = 0
+        self.last_lag = 0.0
+
+    def start(self, graph: CompiledStateGraph):
+        self._graph = graph
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"memory-worker-{i}")
+            for i in range(self._num_workers)
+        ]
+
+    def submit(self, config: RunnableConfig) -> bool:
+        """Schedule extraction for the thread in ``config``; never blocks the caller."""
+        thread_id = config["configurable"]["thread_id"]
+        self.submitted += 1
+
+        for waiting in (self._pending, self._dirty):
+            if thread_id in waiting:
+                # Keep the original enqueue time so lag reflects the oldest turn
+                _, enqueued_at = waiting[thread_id]
+                waiting[thread_id] = (config, enqueued_at)
+                self.coalesced += 1
+                return True
+
+        if thread_id in self._active:
+            # Runs again after the current extraction, never alongside it
+            self._dirty[thread_id] = (config, time.monotonic())
+            return True
+
+        return self._enqueue(thread_id, config, time.monotonic())
+
+    def _enqueue(self, thread_id: str, config: RunnableConfig, enqueued_at: float) -> bool:
+        try:
+            self._queue.put_nowait(thread_id)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Memory queue full, skipping extraction for {thread_id}")
+            return False
+
+        self._pending[thread_id] = (config, enqueued_at)
+        return True
+
+    async def _worker(self):
+        while True:
+            thread_id = await self._queue.get()
+            config, enqueued_at = self._pending.pop(thread_id)
+            self.last_lag = time.monotonic() - enqueued_at
+            self._active.add(thread_id)
+            try:
+                await self._process(thread_id, config)
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception(f"Memory extraction failed for thread {thread_id}")
+            finally:
+                self._active.discard(thread_id)
+                if thread_id in self._dirty:
+                    # Before task_done, so stop() still waits for the rerun
+                    self._enqueue(thread_id, *self._dirty.pop(thread_id))
+                self._queue.task_done()
+
+    async def _process(self, thread_id: str, config: RunnableConfig):
+        state = (await self._graph.aget_state(config)).values
+        if not state.get("messages"):
+            return
+        await update_memory(state=state, config=config, store=self._graph.store)
+        summary = await summarize_conversation(state, config)
+        if not summary:
+            return
+
+        # Written against the latest checkpoint, never mid-turn
+        async with thread_locks.hold(thread_id):
+            latest = (await self._graph.aget_state(config)).values
+            if latest.get("summary") != state.get("summary"):
+                # another run summarized this thread in the meantime
+                return
+            await self._graph.aupdate_state(config, summary, as_node="call_model")
+            self.summarized += 1
+
+    async def stop(self, timeout: float = 10.0):
+        """Give queued extractions ``timeout`` seconds to finish, then cancel the workers."""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Stopping memory workers with {self._queue.qsize()} threads still queued"
+            )
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        waiting = list(self._pending.values()) + list(self._dirty.values())
+        oldest = min((t for _, t in waiting), default=now)
+        return {
+            "depth": self._queue.qsize(),
+            "workers": len(self._workers),
+            "active": len(self._active),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "processed": self.processed,
+            "summarized": self.summarized,
+            "failed": self.failed,
+            "oldest_pending_seconds": round(now - oldest, 3),
+            "last_lag_seconds": round(self.last_lag, 3),
+        }
+
+
+memory_queue = MemoryExtractionQueue(
+    maxsize=settings.MEMORY_QUEUE_SIZE, workers=settings.MEMORY_WORKERS
+)
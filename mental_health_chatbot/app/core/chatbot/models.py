@@ -1,9 +1,30 @@
-from pydantic import BaseModel
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+from app.core.config import settings
 
 
 class MessageRequest(BaseModel):
     message: str
+    # Continue an existing conversation; a new thread is started when omitted
+    thread_id: Optional[str] = None
 
 
 class ChatResponse(BaseModel):
     response: str
+    thread_id: str
+
+
+class BatchRequest(BaseModel):
+    messages: List[MessageRequest] = Field(..., max_length=settings.REST_BATCH_MAX_MESSAGES)
+
+
+class BatchItem(BaseModel):
+    thread_id: str
+    response: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    results: List[BatchItem]
@@ -0,0 +1,91 @@
+"""Prompt assembly for ``call_model``.
+
+The prompt is a list of messages in a fixed order, most stable first:
+
+    static system prompt | user memories | conversation summary | history
+
+The static system message is built once at import and is byte-identical
+for every user and turn, so providers with prompt caching can reuse the
+prefix. Memories and the summary are passed as their own messages, never
+through a template, so braces in stored JSON are just text. The memory
+message is cached per (user, memory version) and only rebuilt when the
+user's memories change.
+"""
+
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AnyMessage, SystemMessage
+from langgraph.store.base import Item
+
+from app.core.chatbot.memory import format_memories
+from app.core.config import settings
+from app.utils.sys_prompt import SYSTEM_PROMPT
+
+# The system prompt ends with a header line and an "{info}" slot for the
+# user's memories. The text before the header is the static prefix; the
+# header opens the memory message, so it is only sent along with memories.
+_STATIC_PREFIX, _, MEMORY_HEADER = (
+    SYSTEM_PROMPT.partition("{info}")[0].rstrip().rpartition("\n")
+)
+MEMORY_HEADER = MEMORY_HEADER.strip()
+STATIC_SYSTEM_MESSAGE = SystemMessage(content=_STATIC_PREFIX.rstrip())
+
+
+def memory_version(memories: Sequence[Item]) -> Tuple:
+    # Every save bumps updated_at, so this changes whenever a memory does
+    return tuple((item.key, item.updated_at) for item in memories)
+
+
+class PromptAssembler:
+    def __init__(self, max_entries: int = settings.PROMPT_CACHE_SIZE):
+        self.max_entries = max_entries
+        # (user_id, memory version) -> memory message, least recently used first
+        self._memory_messages: "OrderedDict[Tuple[str, Tuple], SystemMessage]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def memory_message(self, user_id: str, memories: Sequence[Item]) -> Optional[SystemMessage]:
+        if not memories:
+            return None
+        key = (user_id, memory_version(memories))
+        message = self._memory_messages.get(key)
+        if message is not None:
+            self._memory_messages.move_to_end(key)
+            self.hits += 1
+            return message
+
+        self.misses += 1
+        message = SystemMessage(content=f"{MEMORY_HEADER}\n\n{format_memories(memories)}")
+        self._memory_messages[key] = message
+        while len(self._memory_messages) > self.max_entries:
+            self._memory_messages.popitem(last=False)
+        return message
+
+    def assemble(
+        self,
+        user_id: str,
+        memories: Sequence[Item],
+        messages: Sequence[AnyMessage],
+        summary: Optional[str] = None,
+    ) -> List[AnyMessage]:
+        prompt: List[AnyMessage] = [STATIC_SYSTEM_MESSAGE]
+        memory = self.memory_message(user_id, memories)
+        if memory is not None:
+            prompt.append(memory)
+        if summary:
+            prompt.append(SystemMessage(content=f"Summary of the earlier conversation: {summary}"))
+        prompt.extend(messages)
+        return prompt
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._memory_messages),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+prompt_assembler = PromptAssembler()
@@ -0,0 +1,150 @@
+"""Opt-in cache of replies to common opening messages.
+
+Many sessions open with near-identical messages ("hi", "I feel anxious") and
+no stored memories, so the reply depends only on the message and the system
+prompt. Such first turns are looked up by exact normalised text and then by
+embedding similarity. Anything that looks like a crisis disclosure is never
+served from or written to the cache: those replies must always come from the
+model.
+"""
+
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.embeddings import embedding_service
+from app.utils.sys_prompt import SYSTEM_PROMPT
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT_HASH = hashlib.sha256(SYSTEM_PROMPT.encode()).hexdigest()[:16]
+
+CRISIS = re.compile(
+    r"suicid|kill (my|him|her|them)sel|end (my|it all)|want to die|don'?t want to (live|be here)"
+    r"|self[- ]?harm|hurt (my|him|her)self|cutting|overdos|abus|rape|assault|emergency"
+    r"|no reason to live|better off dead|hopeless",
+    re.IGNORECASE,
+)
+PUNCTUATION = re.compile(r"[^\w\s']")
+
+
+def normalize(text: str) -> str:
+    return " ".join(PUNCTUATION.sub(" ", text.lower()).split())
+
+
+def is_crisis(text: str) -> bool:
+    return bool(CRISIS.search(text))
+
+
+class _Entry:
+    __slots__ = ("response", "vector", "expires_at", "safe")
+
+    def __init__(self, response: str, vector: Optional[np.ndarray], expires_at: float, safe: bool):
+        self.response = response
+        self.vector = vector
+        self.expires_at = expires_at
+        self.safe = safe
+
+
+class ResponseCache:
+    def __init__(self, enabled: bool, max_entries: int, ttl: float, threshold: float):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        # (system prompt hash, normalised text) -> entry, least recently used first
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+
+        self.lookups = 0
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.bypassed = 0
+        self.stores = 0
+
+    async def _embed(self, text: str) -> Optional[np.ndarray]:
+        try:
+            vector = np.asarray(await embedding_service.aembed_query(text), dtype=np.float32)
+        except Exception:
+            logger.exception("Response cache embedding failed")
+            return None
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _evict_expired(self, now: float):
+        for key in [k for k, e in self._entries.items() if e.expires_at < now]:
+            del self._entries[key]
+
+    async def lookup(self, text: str, system_hash: str = SYSTEM_PROMPT_HASH) -> Optional[str]:
+        if is_crisis(text):
+            self.bypassed += 1
+            return None
+        self.lookups += 1
+        now = time.monotonic()
+        key = (system_hash, normalize(text))
+
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at >= now and entry.safe:
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry.response
+
+        candidates = [
+            (k, e)
+            for k, e in self._entries.items()
+            if k[0] == system_hash and e.safe and e.vector is not None and e.expires_at >= now
+        ]
+        if not candidates:
+            return None
+        vector = await self._embed(text)
+        if vector is None:
+            return None
+        scores = np.stack([e.vector for _, e in candidates]) @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        best_key, best_entry = candidates[best]
+        self._entries.move_to_end(best_key)
+        self.semantic_hits += 1
+        return best_entry.response
+
+    async def store(self, text: str, response: str, system_hash: str = SYSTEM_PROMPT_HASH):
+        if is_crisis(text):
+            return
+        now = time.monotonic()
+        self._evict_expired(now)
+        self._entries[(system_hash, normalize(text))] = _Entry(
+            response,
+            await self._embed(text),
+            now + self.ttl,
+            # A reply that itself raises safety topics is kept out of reuse
+            safe=not is_crisis(response),
+        )
+        self.stores += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.semantic_hits
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "lookups": self.lookups,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "hit_rate": round(hits / self.lookups, 3) if self.lookups else 0.0,
+            "crisis_bypassed": self.bypassed,
+            "stores": self.stores,
+        }
+
+
+response_cache = ResponseCache(
+    enabled=settings.RESPONSE_CACHE_ENABLED,
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl=settings.RESPONSE_CACHE_TTL,
+    threshold=settings.RESPONSE_CACHE_THRESHOLD,
+)
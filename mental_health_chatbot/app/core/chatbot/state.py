@@ -0,0 +1,10 @@
+from typing import Optional
+
+from langgraph.graph import MessagesState
+
+
+class ChatState(MessagesState):
+    # legacy: the extraction cursor now lives in the store (memory.get_cursor)
+    memory_cursor: Optional[str]
+    # running summary of the messages trimmed from the prompt
+    summary: Optional[str]
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+from typing import List, Optional
+
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, RemoveMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig
+
+from app.core.chatbot.state import ChatState
+from app.core.config import settings
+from app.core.llm import BACKGROUND, llm
+from app.core.metrics import stage
+from app.utils.summary_prompt import SUMMARY_PROMPT
+from app.utils.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+PROMPT = ChatPromptTemplate.from_messages([("system", SUMMARY_PROMPT)])
+
+def format_history(messages: List[AnyMessage]) -> list:
+    conv_history = []
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            conv_history.append({"User": message.content})
+        elif isinstance(message, AIMessage):
+            conv_history.append({"Chatbot": message.content})
+    return conv_history
+
+
+async def chat_summary(
+    chat_history: List[dict],
+    summary: Optional[str] = None,
+    user_id: Optional[str] = None,
+) -> str:
+    """
+    Create a summary of the chat history using the provided prompt.
+    An existing summary is folded in so the result covers the whole conversation.
+    """
+    history = chat_history
+    if summary:
+        history = [{"summary of the earlier conversation": summary}] + chat_history
+    prompt = await PROMPT.ainvoke({"history": history})
+    response = await llm.ainvoke(prompt, user_id=user_id, priority=BACKGROUND)
+    return response.content
+
+
+def split_for_summary(messages: List[AnyMessage], keep_turns: int) -> int:
+    """Index of the first message kept verbatim: the start of the last ``keep_turns`` turns."""
+    turns = 0
+    for index in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[index], HumanMessage):
+            turns += 1
+            if turns == keep_turns:
+                return index
+    return 0
+
+
+async def summarize_conversation(state: ChatState, config: RunnableConfig):
+    """Fold older messages into the running summary once the history is over budget.
+
+    The last ``SUMMARY_KEEP_TURNS`` turns stay verbatim; everything before them
+    is summarized, and the returned update removes them from the state, so the
+    prompt built by ``call_model`` stays bounded however long the session runs.
+    Runs in the memory workers after a turn, never inside one: the turn that
+    crosses the budget does not wait for the summary, the next one uses it.
+    """
+    messages = state["messages"]
+    if count_tokens(messages) <= settings.SUMMARY_TOKEN_BUDGET:
+        return {}
+
+    cut = split_for_summary(messages, settings.SUMMARY_KEEP_TURNS)
+    if cut == 0:
+        return {}
+
+    older = messages[:cut]
+    with stage("summarize"):
+        summary = await chat_summary(
+            format_history(older),
+            state.get("summary"),
+            user_id=config["configurable"].get("user_id"),
+        )
+    logger.info(f"Summarized {len(older)} messages into the running summary")
+    return {
+        "summary": summary,
+        "messages": [RemoveMessage(id=message.id) for message in older],
+    }
+
+
+if __name__ == "__main__":
+    chat_history = [
+        {"bot": "How are you feeling today?"},
+        {"user": "I'm doing very well, just so anxious about my upcoming exams."},
+        {
+            "bot": "I understand. It's normal to feel anxious before exams. Would you like some tips to manage your anxiety?"
+        },
+        {"user": "Yes, that would be helpful."},
+        {
+            "bot": "One technique that can help is deep breathing. Try inhaling for 4 seconds, holding for 4 seconds, and exhaling for 4 seconds. Would you like to try it now?"
+        },
+        {"user": "Okay, I can try that."},
+        {
+            "bot": "Great! Let's start. Inhale for 4 seconds... hold for 4 seconds... now exhale for 4 seconds. How do you feel?"
+        },
+        {"user": "I feel a little bit better, thanks!"},
+        {
+            "bot": "I'm glad to hear that! It's important to take breaks and breathe during stressful moments. Is there anything else you'd like to talk about?"
+        },
+        {"user": "I'm also feeling a bit overwhelmed with my workload."},
+        {
+            "bot": "It sounds like you have a lot on your plate. One way to manage this is by breaking down tasks into smaller, more manageable steps. Do you think that might help?"
+        },
+        {"user": "Yes, that sounds like a good idea."},
+        {
+            "bot": "I'm happy to help! Remember, taking things step by step can make everything seem more manageable. You're doing great!"
+        },
+    ]
+    summary = asyncio.run(chat_summary(chat_history))
+    print(summary)
@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
@@ -9,10 +10,144 @@ load_dotenv()
 class Settings(BaseSettings):
     PROJECT_NAME: str = os.getenv("PROJECT NAME", "Mental Engine Chatbot")
     THREAD_ID: str = os.getenv("THREAD_ID", "abc345")  # should be made dynamic
-    GROQ_API_KEY: str = os.getenv("GROQ_API_KEY")
+    # Only needed once a model is built; chat_model raises if it is missing
+    GROQ_API_KEY: Optional[str] = os.getenv("GROQ_API_KEY")
     DATABASE_URL: str = os.getenv("DATABASE_URL")
+    # "postgres", or "memory" to run without a database (load tests, local runs)
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "postgres")
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key")
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
+    # Previous signing keys still accepted during rotation, "kid=secret,..."
+    SECRET_KEYS: str = os.getenv("SECRET_KEYS", "")
+    # Verified token claims are cached until exp, at most AUTH_CACHE_TTL seconds
+    AUTH_CACHE_SIZE: int = int(os.getenv("AUTH_CACHE_SIZE", 50000))
+    AUTH_CACHE_TTL: float = float(os.getenv("AUTH_CACHE_TTL", 900))
+
+    # Outbound LLM traffic: model, shared HTTP pool and concurrency limits
+    LLM_MODEL: str = os.getenv("LLM_MODEL", "meta-llama/llama-4-scout-17b-16e-instruct")
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", 64))
+    LLM_PER_USER_CONCURRENCY: int = int(os.getenv("LLM_PER_USER_CONCURRENCY", 2))
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", 100))
+    LLM_MAX_KEEPALIVE: int = int(os.getenv("LLM_MAX_KEEPALIVE", 20))
+    LLM_KEEPALIVE_EXPIRY: float = float(os.getenv("LLM_KEEPALIVE_EXPIRY", 30))
+    LLM_TIMEOUT: float = float(os.getenv("LLM_TIMEOUT", 60))
+    # Scheduling under provider throttling
+    LLM_FALLBACK_MODEL: str = os.getenv("LLM_FALLBACK_MODEL", "llama3-8b-8192")
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", 3))
+    LLM_RETRY_BASE_DELAY: float = float(os.getenv("LLM_RETRY_BASE_DELAY", 0.5))
+    LLM_RETRY_MAX_DELAY: float = float(os.getenv("LLM_RETRY_MAX_DELAY", 8))
+    # Hedge interactive calls slower than this many seconds (0 disables)
+    LLM_HEDGE_AFTER: float = float(os.getenv("LLM_HEDGE_AFTER", 0))
+    # Budget left to interactive replies; background calls wait below it
+    LLM_RESERVED_REQUESTS: int = int(os.getenv("LLM_RESERVED_REQUESTS", 5))
+    LLM_RESERVED_TOKENS: int = int(os.getenv("LLM_RESERVED_TOKENS", 2000))
+
+    # Shared Postgres pool used by the LangGraph store and checkpointer
+    DB_POOL_MIN_SIZE: int = int(os.getenv("DB_POOL_MIN_SIZE", 2))
+    DB_POOL_MAX_SIZE: int = int(os.getenv("DB_POOL_MAX_SIZE", 20))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", 30))
+    DB_POOL_MAX_IDLE: float = float(os.getenv("DB_POOL_MAX_IDLE", 600))
+
+    # Background long-term memory extraction
+    MEMORY_WORKERS: int = int(os.getenv("MEMORY_WORKERS", 2))
+    MEMORY_QUEUE_SIZE: int = int(os.getenv("MEMORY_QUEUE_SIZE", 1000))
+    # Already-processed messages re-sent as context with each extraction
+    MEMORY_CONTEXT_MESSAGES: int = int(os.getenv("MEMORY_CONTEXT_MESSAGES", 4))
+    # Semantic memory retrieval (pgvector index over the memory store)
+    EMBEDDING_MODEL: str = os.getenv(
+        "EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2"
+    )
+    EMBEDDING_DIMS: int = int(os.getenv("EMBEDDING_DIMS", 768))
+    # Shared embedding service: micro-batching window, cache and threads
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+    EMBEDDING_BATCH_WAIT: float = float(os.getenv("EMBEDDING_BATCH_WAIT", 0.005))
+    EMBEDDING_CACHE_SIZE: int = int(os.getenv("EMBEDDING_CACHE_SIZE", 10000))
+    EMBEDDING_THREADS: int = int(os.getenv("EMBEDDING_THREADS", 1))
+    EMBEDDING_WARMUP: bool = os.getenv("EMBEDDING_WARMUP", "true").lower() == "true"
+    MEMORY_TOP_K: int = int(os.getenv("MEMORY_TOP_K", 5))
+    MEMORY_MIN_SCORE: float = float(os.getenv("MEMORY_MIN_SCORE", 0.3))
+    # pgvector >= 0.8: keep scanning the HNSW index until filtered results fill k
+    HNSW_ITERATIVE_SCAN: str = os.getenv("HNSW_ITERATIVE_SCAN", "relaxed_order")
+    # Recall memory used by the agent tools: "local" (numpy + disk snapshots)
+    # or "pgvector" (shared across workers)
+    RECALL_BACKEND: str = os.getenv("RECALL_BACKEND", "local")
+    RECALL_SNAPSHOT_DIR: str = os.getenv("RECALL_SNAPSHOT_DIR", "data/recall")
+    RECALL_SNAPSHOT_INTERVAL: float = float(os.getenv("RECALL_SNAPSHOT_INTERVAL", 60))
+    # Partitions smaller than this are searched exactly
+    RECALL_IVF_MIN_SIZE: int = int(os.getenv("RECALL_IVF_MIN_SIZE", 1024))
+    RECALL_IVF_NPROBE: int = int(os.getenv("RECALL_IVF_NPROBE", 4))
+    # Opt-in cache of replies to memory-less opening messages
+    RESPONSE_CACHE_ENABLED: bool = (
+        os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+    )
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 1000))
+    RESPONSE_CACHE_TTL: float = float(os.getenv("RESPONSE_CACHE_TTL", 3600))
+    RESPONSE_CACHE_THRESHOLD: float = float(os.getenv("RESPONSE_CACHE_THRESHOLD", 0.95))
+    # In-process cache of memory lookups made by call_model
+    MEMORY_CACHE_TTL: float = float(os.getenv("MEMORY_CACHE_TTL", 300))
+    MEMORY_CACHE_MAX_BYTES: int = int(os.getenv("MEMORY_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    # Rendered memory prompt blocks kept, one per (user, memory version)
+    PROMPT_CACHE_SIZE: int = int(os.getenv("PROMPT_CACHE_SIZE", 10000))
+
+    # Rolling summary: history above the budget is folded into a summary by
+    # the memory workers after the turn, keeping the last SUMMARY_KEEP_TURNS
+    # turns verbatim
+    SUMMARY_TOKEN_BUDGET: int = int(os.getenv("SUMMARY_TOKEN_BUDGET", 3000))
+    SUMMARY_KEEP_TURNS: int = int(os.getenv("SUMMARY_KEEP_TURNS", 4))
+
+    # State shared between workers (guest limits, broadcast fan-out):
+    # "memory" for a single process, "postgres" for several workers or pods
+    COORDINATION_BACKEND: str = os.getenv("COORDINATION_BACKEND", "memory")
+    GUEST_CHAT_LIMIT: int = int(os.getenv("GUEST_CHAT_LIMIT", 10))
+    GUEST_CHAT_WINDOW: float = float(os.getenv("GUEST_CHAT_WINDOW", 24 * 60 * 60))
+
+    # WebSocket limits. Dead peers are found by protocol-level pings from
+    # uvicorn every WS_PING_INTERVAL, closed after WS_PING_TIMEOUT without a
+    # pong; browsers answer these on their own
+    WS_MAX_CONNECTIONS: int = int(os.getenv("WS_MAX_CONNECTIONS", 10000))
+    WS_MAX_CONNECTIONS_PER_USER: int = int(os.getenv("WS_MAX_CONNECTIONS_PER_USER", 5))
+    WS_PING_INTERVAL: float = float(os.getenv("WS_PING_INTERVAL", 20))
+    WS_PING_TIMEOUT: float = float(os.getenv("WS_PING_TIMEOUT", 20))
+    # Opt-in app-level heartbeat: with WS_IDLE_TIMEOUT > 0, sockets silent for
+    # WS_HEARTBEAT_INTERVAL get a {"type": "ping"} frame and sockets silent for
+    # WS_IDLE_TIMEOUT are closed, so clients must answer {"type": "pong"}
+    WS_HEARTBEAT_INTERVAL: float = float(os.getenv("WS_HEARTBEAT_INTERVAL", 30))
+    WS_IDLE_TIMEOUT: float = float(os.getenv("WS_IDLE_TIMEOUT", 0))
+    # Messages a socket may queue behind its running turn, and turns that may
+    # wait on one thread across sockets, before clients get a "busy" frame
+    SESSION_MAX_PENDING: int = int(os.getenv("SESSION_MAX_PENDING", 4))
+    THREAD_MAX_PENDING: int = int(os.getenv("THREAD_MAX_PENDING", 8))
+    # Outbound frames as binary (UTF-8 JSON bytes, no decode step) instead of
+    # text; clients must then decode them. Per-message deflate is offered in the
+    # handshake and, once a client accepts it, applies to every frame on that socket
+    WS_BINARY_FRAMES: bool = os.getenv("WS_BINARY_FRAMES", "false").lower() == "true"
+    WS_PER_MESSAGE_DEFLATE: bool = os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower() == "true"
+
+    # REST batch endpoint: messages per request and turns run at once
+    REST_BATCH_MAX_MESSAGES: int = int(os.getenv("REST_BATCH_MAX_MESSAGES", 50))
+    REST_BATCH_CONCURRENCY: int = int(os.getenv("REST_BATCH_CONCURRENCY", 8))
+
+    # Checkpoint retention: keep the newest CHECKPOINT_KEEP checkpoints per
+    # thread and archive threads idle for CHECKPOINT_ARCHIVE_AFTER_DAYS
+    # (0 disables either); runs every CHECKPOINT_COMPACTION_INTERVAL seconds
+    CHECKPOINT_KEEP: int = int(os.getenv("CHECKPOINT_KEEP", 20))
+    CHECKPOINT_ARCHIVE_AFTER_DAYS: float = float(os.getenv("CHECKPOINT_ARCHIVE_AFTER_DAYS", 30))
+    CHECKPOINT_COMPACTION_INTERVAL: float = float(os.getenv("CHECKPOINT_COMPACTION_INTERVAL", 3600))
+    CHECKPOINT_COMPACTION_BATCH: int = int(os.getenv("CHECKPOINT_COMPACTION_BATCH", 500))
+    # Checkpoint blob encoding: "msgpack+zstd" compresses blobs of at least
+    # CHECKPOINT_COMPRESS_MIN_BYTES, "msgpack" stores them as they are
+    CHECKPOINT_SERDE: str = os.getenv("CHECKPOINT_SERDE", "msgpack+zstd")
+    CHECKPOINT_COMPRESS_MIN_BYTES: int = int(os.getenv("CHECKPOINT_COMPRESS_MIN_BYTES", 1024))
+    CHECKPOINT_ZSTD_LEVEL: int = int(os.getenv("CHECKPOINT_ZSTD_LEVEL", 3))
+
+    # app.server: worker processes (0 = one per usable CPU core, or a single
+    # worker while any backend is process-local) and how long a stopping
+    # worker lets in-flight turns finish
+    SERVER_HOST: str = os.getenv("SERVER_HOST", "0.0.0.0")
+    SERVER_PORT: int = int(os.getenv("SERVER_PORT", 8000))
+    SERVER_WORKERS: int = int(os.getenv("SERVER_WORKERS", 0))
+    SERVER_BACKLOG: int = int(os.getenv("SERVER_BACKLOG", 2048))
+    SERVER_DRAIN_TIMEOUT: float = float(os.getenv("SERVER_DRAIN_TIMEOUT", 30))
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,34 @@
+from typing import Optional
+
+from fastapi import HTTPException, status
+from langgraph.graph.state import CompiledStateGraph
+from psycopg_pool import AsyncConnectionPool
+from starlette.requests import HTTPConnection
+
+from app.core.lifecycle import lifecycle
+from app.db.checkpoints import CheckpointCompactor
+
+
+# Shared objects are built once in the app lifespan (see app.main) and
+# handed to the routers through these dependencies. Pool and compactor are
+# None with STORAGE_BACKEND=memory.
+def get_graph(connection: HTTPConnection) -> CompiledStateGraph:
+    return connection.app.state.graph
+
+
+def get_pool(connection: HTTPConnection) -> Optional[AsyncConnectionPool]:
+    return connection.app.state.pool
+
+
+def get_compactor(connection: HTTPConnection) -> Optional[CheckpointCompactor]:
+    return connection.app.state.compactor
+
+
+def accepting_turns():
+    # A draining worker finishes what it has; new turns go to another worker
+    if lifecycle.draining:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is restarting, please retry",
+            headers={"Retry-After": "1"},
+        )
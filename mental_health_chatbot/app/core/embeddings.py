@@ -0,0 +1,199 @@
+"""Process-wide embedding service.
+
+The sentence-transformers model is loaded on first use (or by ``warm_up``
+during startup), never at import. Concurrent ``aembed_documents`` calls from
+many coroutines are collected for up to ``EMBEDDING_BATCH_WAIT`` seconds and
+embedded in a single forward pass on a worker thread, and vectors are cached
+by a hash of the text so repeated inputs skip the model entirely.
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+class EmbeddingService(Embeddings):
+    def __init__(
+        self,
+        model_name: str,
+        batch_size: int,
+        batch_wait: float,
+        cache_size: int,
+        threads: int,
+    ):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.cache_size = cache_size
+
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(threads, thread_name_prefix="embeddings")
+        self._cache: "OrderedDict[bytes, List[float]]" = OrderedDict()
+        # Texts waiting for the next batch, and their futures keyed by text hash
+        self._pending: List[Tuple[bytes, str]] = []
+        self._inflight: Dict[bytes, asyncio.Future] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._batches: Set[asyncio.Task] = set()
+
+        self.requests = 0
+        self.cache_hits = 0
+        self.batches = 0
+        self.batched_texts = 0
+
+    def _load(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from langchain_huggingface import HuggingFaceEmbeddings
+
+                    logger.info(f"Loading embedding model {self.model_name}")
+                    self._model = HuggingFaceEmbeddings(model_name=self.model_name)
+        return self._model
+
+    def _cache_get(self, key: bytes) -> Optional[List[float]]:
+        vector = self._cache.get(key)
+        if vector is not None:
+            self._cache.move_to_end(key)
+        return vector
+
+    def _cache_put(self, key: bytes, vector: List[float]):
+        self._cache[key] = vector
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self._load().embed_documents(texts)
+
+    # Sync API, for callers outside the event loop
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [_key(text) for text in texts]
+        vectors = [self._cache_get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            for i, vector in zip(missing, self._embed_batch([texts[i] for i in missing])):
+                vectors[i] = vector
+                self._cache_put(keys[i], vector)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            self.requests += 1
+            key = _key(text)
+            vector = self._cache_get(key)
+            if vector is not None:
+                self.cache_hits += 1
+                future = loop.create_future()
+                future.set_result(vector)
+            elif key in self._inflight:
+                # Same text already queued or running: share its result
+                future = self._inflight[key]
+            else:
+                future = loop.create_future()
+                self._inflight[key] = future
+                self._pending.append((key, text))
+            futures.append(future)
+
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._pending and self._timer is None:
+            self._timer = loop.call_later(self.batch_wait, self._flush)
+
+        # Shared futures are shielded: a caller that is cancelled must not
+        # cancel the result for everyone else waiting on the same text
+        return list(await asyncio.gather(*(asyncio.shield(f) for f in futures)))
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = self._pending[: self.batch_size]
+            self._pending = self._pending[self.batch_size :]
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: List[Tuple[bytes, str]]):
+        self.batches += 1
+        self.batched_texts += len(batch)
+        loop = asyncio.get_running_loop()
+        try:
+            vectors = await loop.run_in_executor(
+                self._executor, self._embed_batch, [text for _, text in batch]
+            )
+        except asyncio.CancelledError:
+            # Only at shutdown; nothing would ever resolve these otherwise
+            for key, _ in batch:
+                self._inflight.pop(key).cancel()
+            raise
+        except Exception as e:
+            for key, _ in batch:
+                future = self._inflight.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (key, _), vector in zip(batch, vectors):
+            self._cache_put(key, vector)
+            future = self._inflight.pop(key)
+            if not future.done():
+                future.set_result(vector)
+
+    async def warm_up(self):
+        """Load the model and run one forward pass off the event loop."""
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._embed_batch, ["warm up"]
+            )
+            logger.info("Embedding model ready")
+        except Exception:
+            logger.exception("Embedding warm-up failed; the model loads on first use")
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "requests": self.requests,
+            "cache_hits": self.cache_hits,
+            "cache_size": len(self._cache),
+            "batches": self.batches,
+            "avg_batch_size": round(self.batched_texts / self.batches, 2)
+            if self.batches
+            else 0.0,
+            "pending": len(self._pending),
+        }
+
+
+embedding_service = EmbeddingService(
+    model_name=settings.EMBEDDING_MODEL,
+    batch_size=settings.EMBEDDING_BATCH_SIZE,
+    batch_wait=settings.EMBEDDING_BATCH_WAIT,
+    cache_size=settings.EMBEDDING_CACHE_SIZE,
+    threads=settings.EMBEDDING_THREADS,
+)
@@ -0,0 +1,25 @@
+"""JSON encoding for everything the server sends: WebSocket frames and SSE events.
+
+orjson encodes straight to UTF-8 bytes, several times faster than the
+stdlib encoder, and frames are built once per message (broadcasts and
+token deltas included), so the saving shows up on every turn. REST
+responses get the same encoder through ``ORJSONResponse``.
+
+Output is compact (no spaces after separators); it is the same JSON to
+any parser.
+"""
+
+from typing import Any, Union
+
+import orjson
+
+# An outbound WebSocket frame: encoded JSON, or text from elsewhere (broker)
+Frame = Union[bytes, str]
+
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj)
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    return orjson.loads(data)
@@ -0,0 +1,42 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class Lifecycle:
+    """Readiness and drain state of this worker process.
+
+    ``ready`` turns on once startup and warm-up are done; ``draining`` turns
+    on at shutdown, after which no new turns or connections are accepted and
+    ``drain()`` waits for the turns already running to finish.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.draining = False
+        self.in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @asynccontextmanager
+    async def turn(self):
+        self.in_flight += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            if not self.in_flight:
+                self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        """Stop taking work and wait for in-flight turns; False on timeout."""
+        self.draining = True
+        self.ready = False
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+lifecycle = Lifecycle()
@@ -0,0 +1,428 @@
+"""Process-wide LLM client registry and request scheduler.
+
+All model calls go through ``llm``:
+
+- models are built once per name on top of a single pooled
+  ``httpx.AsyncClient``, so TLS sessions and keep-alive connections to the
+  provider are reused;
+- every call takes a per-user slot and a global slot; the global slots are
+  handed out by priority, so interactive replies overtake background work
+  such as memory extraction;
+- the provider's rate-limit headers are tracked from every response and
+  background calls hold back while the remaining budget is low;
+- throttled or failed calls are retried with jittered exponential backoff,
+  slow calls can be hedged with a second request, and once retries are
+  exhausted the call falls back to a secondary model. A streamed call is
+  never hedged, and is neither retried nor sent to the fallback once its
+  first token has reached the client.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+import httpx
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, message_chunk_to_message
+
+from app.core.config import settings
+from app.core.metrics import llm_calls_total, record_tokens
+from app.utils.model import chat_model
+
+logger = logging.getLogger(__name__)
+
+# Scheduling priorities, lower runs first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+RETRYABLE_STATUS = {408, 409, 429}
+DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Parse provider reset durations such as ``"2m59.56s"``, ``"7.66s"`` or ``"120ms"``."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * UNITS[unit] for amount, unit in parts)
+
+
+def parse_count(value: Optional[str]) -> Optional[int]:
+    """Parse a remaining-budget header; None if it is missing or malformed."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: BaseException) -> bool:
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS or status >= 500
+    if isinstance(error, (httpx.TransportError, asyncio.TimeoutError)):
+        return True
+    # Matched by name so the provider SDK is not imported at startup
+    return any(cls.__name__ == "APIConnectionError" for cls in type(error).__mro__)
+
+
+class RateLimitTracker:
+    """Remaining request/token budget as reported by the provider's response headers."""
+
+    def __init__(self):
+        self.remaining_requests: Optional[int] = None
+        self.remaining_tokens: Optional[int] = None
+        self.requests_reset_at = 0.0
+        self.tokens_reset_at = 0.0
+        self.blocked_until = 0.0
+        self.throttled = 0
+
+    async def on_response(self, response: httpx.Response):
+        headers = response.headers
+        now = time.monotonic()
+        # Runs as an httpx event hook: a bad header must not fail the call
+        remaining = parse_count(headers.get("x-ratelimit-remaining-requests"))
+        if remaining is not None:
+            self.remaining_requests = remaining
+            reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+            self.requests_reset_at = now + (reset or 0)
+        remaining = parse_count(headers.get("x-ratelimit-remaining-tokens"))
+        if remaining is not None:
+            self.remaining_tokens = remaining
+            reset = parse_duration(headers.get("x-ratelimit-reset-tokens"))
+            self.tokens_reset_at = now + (reset or 0)
+        if response.status_code == 429:
+            self.throttled += 1
+            retry_after = parse_duration(headers.get("retry-after")) or 1.0
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+
+    def delay(self, priority: int) -> float:
+        """Seconds a call of ``priority`` should wait before going out."""
+        now = time.monotonic()
+        wait = self.blocked_until - now
+        if priority != INTERACTIVE:
+            # Leave the last part of each budget to interactive replies
+            if (
+                self.remaining_requests is not None
+                and self.remaining_requests <= settings.LLM_RESERVED_REQUESTS
+            ):
+                wait = max(wait, self.requests_reset_at - now)
+            if (
+                self.remaining_tokens is not None
+                and self.remaining_tokens <= settings.LLM_RESERVED_TOKENS
+            ):
+                wait = max(wait, self.tokens_reset_at - now)
+        return max(wait, 0.0)
+
+
+class PrioritySemaphore:
+    """Semaphore whose waiters are woken lowest priority value first, FIFO within a priority."""
+
+    def __init__(self, value: int):
+        self._value = value
+        self._waiters: List = []
+        self._order = itertools.count()
+
+    async def acquire(self, priority: int = INTERACTIVE):
+        if self._value > 0 and not self._waiters:
+            self._value -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._order), future]
+        heapq.heappush(self._waiters, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Woken and cancelled at once: pass the slot on
+                self.release()
+            elif entry in self._waiters:
+                # release() may already have popped it while skipping cancelled waiters
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._value += 1
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+
+class StreamProgress:
+    """Whether a streamed call has already sent tokens on to the client."""
+
+    __slots__ = ("emitted",)
+
+    def __init__(self):
+        self.emitted = False
+
+
+class LLMRegistry:
+    def __init__(
+        self,
+        max_concurrency: int,
+        per_user_concurrency: int,
+        max_connections: int,
+        max_keepalive: int,
+        keepalive_expiry: float,
+        timeout: float,
+    ):
+        self.per_user_concurrency = per_user_concurrency
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._timeout = timeout
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._models: Dict[str, BaseChatModel] = {}
+        self._global = PrioritySemaphore(max_concurrency)
+        # user_id -> [semaphore, number of holders/waiters]
+        self._users: Dict[str, List] = {}
+        self.rate_limits = RateLimitTracker()
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.in_flight_by_user: Counter = Counter()
+        self.retries = 0
+        self.fallbacks = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failures = 0
+
+    def http_client(self) -> httpx.AsyncClient:
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient(
+                limits=self._limits,
+                timeout=self._timeout,
+                event_hooks={"response": [self.rate_limits.on_response]},
+            )
+        return self._http_client
+
+    def get_model(self, name: Optional[str] = None) -> BaseChatModel:
+        name = name or settings.LLM_MODEL
+        if name not in self._models:
+            # Retries are handled here, not by the provider SDK
+            self._models[name] = chat_model(
+                name, http_async_client=self.http_client(), max_retries=0
+            )
+        return self._models[name]
+
+    def set_model(self, model: BaseChatModel, name: Optional[str] = None):
+        """Serve ``name`` (default: the primary model) with ``model``, e.g. a fake in load tests."""
+        self._models[name or settings.LLM_MODEL] = model
+
+    @asynccontextmanager
+    async def slot(self, user_id: Optional[str] = None, priority: int = INTERACTIVE):
+        """Hold one of the user's slots and one global slot for the duration of a call."""
+        entry = None
+        if user_id is not None:
+            entry = self._users.setdefault(
+                user_id, [asyncio.Semaphore(self.per_user_concurrency), 0]
+            )
+            entry[1] += 1
+        try:
+            self.waiting += 1
+            try:
+                if entry is not None:
+                    await entry[0].acquire()
+                try:
+                    await self._global.acquire(priority)
+                except BaseException:
+                    if entry is not None:
+                        entry[0].release()
+                    raise
+            finally:
+                self.waiting -= 1
+
+            self.in_flight += 1
+            self.in_flight_by_user[user_id] += 1
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+                self.in_flight_by_user[user_id] -= 1
+                if not self.in_flight_by_user[user_id]:
+                    del self.in_flight_by_user[user_id]
+                self._global.release()
+                if entry is not None:
+                    entry[0].release()
+        finally:
+            if entry is not None:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._users[user_id]
+
+    async def _hedged(self, model: BaseChatModel, input):
+        """Send a second identical request if the first is slower than ``LLM_HEDGE_AFTER``."""
+        first = asyncio.ensure_future(model.ainvoke(input))
+        try:
+            done, _ = await asyncio.wait({first}, timeout=settings.LLM_HEDGE_AFTER)
+        except asyncio.CancelledError:
+            # asyncio.wait does not cancel what it waits on
+            first.cancel()
+            raise
+        if done:
+            return first.result()
+
+        self.hedges += 1
+        second = asyncio.ensure_future(model.ainvoke(input))
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+            # Both failed: surface the original request's error
+            return first.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @staticmethod
+    async def _streamed(model: BaseChatModel, input, progress: StreamProgress):
+        """Stream the reply token by token, noting in ``progress`` once one went out."""
+        reply = None
+        async for chunk in model.astream(input):
+            if chunk.content:
+                progress.emitted = True
+            reply = chunk if reply is None else reply + chunk
+        return message_chunk_to_message(reply) if reply is not None else AIMessage(content="")
+
+    async def _call(
+        self,
+        model_name: Optional[str],
+        input,
+        priority: int,
+        hedge: bool,
+        progress: Optional[StreamProgress] = None,
+    ):
+        model = self.get_model(model_name)
+        attempts = settings.LLM_MAX_RETRIES + 1
+        for attempt in range(attempts):
+            delay = self.rate_limits.delay(priority)
+            if delay:
+                await asyncio.sleep(delay)
+            try:
+                if progress is not None:
+                    return await self._streamed(model, input, progress)
+                if hedge and settings.LLM_HEDGE_AFTER > 0:
+                    return await self._hedged(model, input)
+                return await model.ainvoke(input)
+            except Exception as e:
+                # Text already shown to the client cannot be taken back
+                emitted = progress is not None and progress.emitted
+                if emitted or not is_retryable(e) or attempt == attempts - 1:
+                    raise
+                self.retries += 1
+                # Full jitter keeps retries from a burst from arriving together
+                backoff = min(
+                    settings.LLM_RETRY_MAX_DELAY, settings.LLM_RETRY_BASE_DELAY * 2**attempt
+                )
+                logger.warning(f"LLM call failed ({e!r}), retry {attempt + 1}/{attempts - 1}")
+                await asyncio.sleep(random.uniform(0, backoff))
+
+    async def ainvoke(
+        self,
+        input,
+        *,
+        user_id: Optional[str] = None,
+        model: Optional[str] = None,
+        priority: int = INTERACTIVE,
+        hedge: bool = False,
+        stream: bool = False,
+    ):
+        """Run one call; ``stream`` for turns whose tokens go straight to a client.
+
+        Streamed calls are never hedged (every token would be sent twice).
+        """
+        progress = StreamProgress() if stream else None
+        hedge = hedge and not stream
+        async with self.slot(user_id, priority):
+            try:
+                return self._completed(
+                    model, priority, await self._call(model, input, priority, hedge, progress)
+                )
+            except Exception as e:
+                fallback = settings.LLM_FALLBACK_MODEL
+                emitted = progress is not None and progress.emitted
+                if emitted or not fallback or model == fallback or not is_retryable(e):
+                    self.failures += 1
+                    raise
+                self.fallbacks += 1
+                logger.warning(f"Falling back to {fallback} after {e!r}")
+                try:
+                    return self._completed(
+                        fallback,
+                        priority,
+                        await self._call(fallback, input, priority, hedge, progress),
+                    )
+                except Exception:
+                    self.failures += 1
+                    raise
+
+    @staticmethod
+    def _completed(model: Optional[str], priority: int, response):
+        name = model or settings.LLM_MODEL
+        llm_calls_total.inc(model=name, priority="interactive" if priority == INTERACTIVE else "background")
+        record_tokens(name, getattr(response, "usage_metadata", None))
+        return response
+
+    async def aclose(self):
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+        self._models.clear()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "waiting_global": self._global.waiting,
+            "users_in_flight": len(self.in_flight_by_user),
+            "max_user_in_flight": max(self.in_flight_by_user.values(), default=0),
+            "models": list(self._models),
+            "retries": self.retries,
+            "fallbacks": self.fallbacks,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failures": self.failures,
+            "throttled": self.rate_limits.throttled,
+            "remaining_requests": self.rate_limits.remaining_requests,
+            "remaining_tokens": self.rate_limits.remaining_tokens,
+        }
+
+
+llm = LLMRegistry(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    per_user_concurrency=settings.LLM_PER_USER_CONCURRENCY,
+    max_connections=settings.LLM_MAX_CONNECTIONS,
+    max_keepalive=settings.LLM_MAX_KEEPALIVE,
+    keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+    timeout=settings.LLM_TIMEOUT,
+)
@@ -0,0 +1,234 @@
+"""Process metrics in the Prometheus text format, and per-turn timing logs.
+
+A deliberately small registry (counters, gauges, histograms with labels)
+rendered by ``GET /metrics``. Pipeline code wraps its steps in
+``stage(name)``: the duration lands in the ``chat_stage_seconds`` histogram
+and, inside ``trace_turn()``, in the turn's structured log line, so one
+slow turn can be broken down as well as the aggregate.
+"""
+
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.db.serde import measure_turn
+
+logger = logging.getLogger("chatbot.turns")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """Sample lines of the metric, without the HELP/TYPE header."""
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.help}\n# TYPE {self.name} {self.kind}\n"
+        return header + "".join(line + "\n" for line in self.samples())
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labels, k)} {v}" for k, v in self._values.items()
+        ]
+
+
+class Gauge(Metric):
+    """A value set directly, or read from ``function`` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, function: Optional[Callable[[], float]] = None):
+        super().__init__(name, help)
+        self.function = function
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def samples(self) -> List[str]:
+        value = self.function() if self.function else self.value
+        return [f"{self.name} {value}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._values.get(key)
+        if series is None:
+            series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        else:
+            series[len(self.buckets)] += 1
+        series[-1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, series in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                labels = _format_labels(self.labels, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "".join(m.render() for m in self._metrics.values())
+
+
+registry = Registry()
+
+stage_seconds = registry.register(
+    Histogram("chat_stage_seconds", "Duration of one pipeline stage", ["stage"])
+)
+turn_seconds = registry.register(
+    Histogram("chat_turn_seconds", "Duration of a whole chat turn", ["transport"])
+)
+turns_total = registry.register(
+    Counter("chat_turns_total", "Chat turns by outcome", ["transport", "outcome"])
+)
+llm_tokens_total = registry.register(
+    Counter("llm_tokens_total", "Tokens reported by the provider", ["model", "kind"])
+)
+llm_calls_total = registry.register(
+    Counter("llm_calls_total", "Completed LLM calls", ["model", "priority"])
+)
+active_connections = registry.register(
+    Gauge("chat_active_connections", "Open chat WebSockets")
+)
+
+
+class TurnTrace:
+    __slots__ = ("stages", "tokens")
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.tokens: Dict[str, int] = {}
+
+
+_current_turn: ContextVar[Optional[TurnTrace]] = ContextVar("current_turn", default=None)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_seconds.observe(elapsed, stage=name)
+        trace = _current_turn.get()
+        if trace is not None:
+            trace.stages[name] = trace.stages.get(name, 0.0) + elapsed
+
+
+def record_tokens(model: str, usage: Optional[dict]):
+    if not usage:
+        return
+    trace = _current_turn.get()
+    for kind in ("input_tokens", "output_tokens"):
+        count = usage.get(kind) or 0
+        llm_tokens_total.inc(count, model=model, kind=kind.split("_")[0])
+        if trace is not None:
+            trace.tokens[kind] = trace.tokens.get(kind, 0) + count
+
+
+@contextmanager
+def trace_turn(transport: str, user_id: str, thread_id: str) -> Iterator[TurnTrace]:
+    """Time one turn and log its stage breakdown as a single JSON line."""
+    trace = TurnTrace()
+    token = _current_turn.set(trace)
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        with measure_turn() as serde:
+            yield trace
+        outcome = "ok"
+    finally:
+        _current_turn.reset(token)
+        elapsed = time.perf_counter() - started
+        turn_seconds.observe(elapsed, transport=transport)
+        turns_total.inc(transport=transport, outcome=outcome)
+        logger.info(
+            json.dumps(
+                {
+                    "event": "turn",
+                    "transport": transport,
+                    "user_id": user_id,
+                    "thread_id": thread_id,
+                    "outcome": outcome,
+                    "total_ms": round(elapsed * 1000, 1),
+                    "stages_ms": {k: round(v * 1000, 1) for k, v in trace.stages.items()},
+                    "tokens": trace.tokens,
+                    "checkpoint_serde": serde.as_dict(),
+                }
+            )
+        )
@@ -0,0 +1,161 @@
+"""Guest rate limiting shared by every worker.
+
+Limits use a sliding-window counter: hits are counted in fixed windows and
+the previous window's count is weighted by how much of it still overlaps the
+sliding window, which is accurate to within a few percent while needing only
+two counters per key. ``InMemoryRateLimiter`` keeps the counters in the
+process (single worker, tests); ``PostgresRateLimiter`` keeps them in one
+table updated with an atomic upsert, so the limit holds across workers, pods
+and restarts.
+"""
+
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+
+from psycopg_pool import AsyncConnectionPool
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def guest_limit_key(user_id: str) -> str:
+    # Guest ids end in the date; the limit is a sliding window per client
+    # instead, so it must not reset at midnight
+    return user_id.rsplit("-", 1)[0]
+
+
+def sliding_count(previous: int, current: int, window: float, now: float) -> float:
+    elapsed = (now % window) / window
+    return previous * (1 - elapsed) + current
+
+
+class RateLimiter(ABC):
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+
+    @abstractmethod
+    async def hit(self, key: str) -> bool:
+        """Count one hit for ``key``; False if it goes over the limit."""
+
+    async def setup(self):
+        pass
+
+    async def prune(self):
+        """Drop counters for windows that can no longer affect a decision."""
+
+    async def run_pruning(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.prune()
+            except Exception:
+                logger.exception("Rate limit pruning failed")
+
+
+class InMemoryRateLimiter(RateLimiter):
+    # Sweep stale keys every this many hits
+    PRUNE_EVERY = 1000
+
+    def __init__(self, limit: int, window: float):
+        super().__init__(limit, window)
+        # key -> (window index, count in that window, count in the window before)
+        self._counters: Dict[str, Tuple[int, int, int]] = {}
+        self._hits = 0
+
+    async def hit(self, key: str) -> bool:
+        now = time.time()
+        index = int(now // self.window)
+        start, current, previous = self._counters.get(key, (index, 0, 0))
+        if start != index:
+            previous = current if start == index - 1 else 0
+            current = 0
+        current += 1
+        self._counters[key] = (index, current, previous)
+
+        self._hits += 1
+        if self._hits % self.PRUNE_EVERY == 0:
+            await self.prune()
+        return sliding_count(previous, current, self.window, now) <= self.limit
+
+    async def prune(self):
+        index = int(time.time() // self.window)
+        for key in [k for k, v in self._counters.items() if v[0] < index - 1]:
+            del self._counters[key]
+
+
+class PostgresRateLimiter(RateLimiter):
+    def __init__(self, pool: AsyncConnectionPool, limit: int, window: float):
+        super().__init__(limit, window)
+        self.pool = pool
+
+    async def setup(self):
+        async with self.pool.connection() as conn:
+            await conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS rate_limits (
+                    key text NOT NULL,
+                    window_index bigint NOT NULL,
+                    count integer NOT NULL,
+                    PRIMARY KEY (key, window_index)
+                )
+                """
+            )
+
+    async def hit(self, key: str) -> bool:
+        now = time.time()
+        index = int(now // self.window)
+        async with self.pool.connection() as conn:
+            row = await (
+                await conn.execute(
+                    """
+                    WITH current AS (
+                        INSERT INTO rate_limits (key, window_index, count)
+                        VALUES (%(key)s, %(index)s, 1)
+                        ON CONFLICT (key, window_index)
+                        DO UPDATE SET count = rate_limits.count + 1
+                        RETURNING count
+                    )
+                    SELECT current.count AS current,
+                           COALESCE((SELECT count FROM rate_limits
+                                     WHERE key = %(key)s AND window_index = %(index)s - 1), 0)
+                               AS previous
+                    FROM current
+                    """,
+                    {"key": key, "index": index},
+                )
+            ).fetchone()
+        return sliding_count(row["previous"], row["current"], self.window, now) <= self.limit
+
+    async def prune(self):
+        index = int(time.time() // self.window)
+        async with self.pool.connection() as conn:
+            await conn.execute(
+                "DELETE FROM rate_limits WHERE window_index < %s", (index - 1,)
+            )
+
+
+_guest_limiter: Optional[RateLimiter] = None
+
+
+def create_guest_limiter(pool: Optional[AsyncConnectionPool] = None) -> RateLimiter:
+    if settings.COORDINATION_BACKEND == "postgres":
+        return PostgresRateLimiter(
+            pool, settings.GUEST_CHAT_LIMIT, settings.GUEST_CHAT_WINDOW
+        )
+    return InMemoryRateLimiter(settings.GUEST_CHAT_LIMIT, settings.GUEST_CHAT_WINDOW)
+
+
+def set_guest_limiter(limiter: RateLimiter):
+    global _guest_limiter
+    _guest_limiter = limiter
+
+
+def get_guest_limiter() -> RateLimiter:
+    if _guest_limiter is None:
+        set_guest_limiter(create_guest_limiter())
+    return _guest_limiter
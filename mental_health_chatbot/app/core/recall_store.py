@@ -0,0 +1,307 @@
+"""Recall memory: short free-text memories saved and searched by the agent tools.
+
+Vectors are partitioned per user, so a search only ever touches the caller's
+own memories and its cost does not grow with the number of users. Two
+backends implement ``RecallStore``:
+
+- ``LocalRecallStore`` keeps each user's vectors in a numpy matrix with an
+  IVF (inverted file) index once the partition is large enough, loads
+  partitions lazily and persists them as snapshots on disk.
+- ``PgVectorRecallStore`` keeps them in Postgres with a pgvector HNSW index,
+  shared by every worker and pod.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import uuid
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from psycopg_pool import AsyncConnectionPool
+
+from app.core.config import settings
+from app.core.embeddings import embedding_service
+
+logger = logging.getLogger(__name__)
+
+
+async def embed(texts: List[str]) -> np.ndarray:
+    """Embed ``texts`` in one call and L2-normalise, so dot product is cosine similarity."""
+    vectors = np.asarray(
+        await embedding_service.aembed_documents(texts), dtype=np.float32
+    )
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class RecallStore(ABC):
+    @abstractmethod
+    async def add(self, user_id: str, texts: List[str]) -> List[str]:
+        """Embed and store ``texts`` for ``user_id`` in one batch; returns their ids."""
+
+    @abstractmethod
+    async def search(self, user_id: str, query: str, k: int = 3) -> List[str]:
+        """The ``k`` memories of ``user_id`` closest to ``query``."""
+
+    async def setup(self):
+        pass
+
+    async def flush(self):
+        pass
+
+    async def aclose(self):
+        await self.flush()
+
+
+class _Partition:
+    """One user's vectors with an optional IVF index over them."""
+
+    __slots__ = (
+        "ids",
+        "texts",
+        "vectors",
+        "size",
+        "centroids",
+        "lists",
+        "trained_size",
+        "dirty",
+    )
+
+    def __init__(self, dims: int):
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.vectors = np.empty((0, dims), dtype=np.float32)
+        self.size = 0
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: List[List[int]] = []
+        self.trained_size = 0
+        self.dirty = False
+
+    def add(self, ids: List[str], texts: List[str], vectors: np.ndarray):
+        needed = self.size + len(vectors)
+        if needed > len(self.vectors):
+            # Grow geometrically so a stream of small batches stays amortised O(1)
+            grown = np.empty(
+                (max(needed, 2 * len(self.vectors), 16), self.vectors.shape[1]),
+                dtype=np.float32,
+            )
+            grown[: self.size] = self.vectors[: self.size]
+            self.vectors = grown
+        self.vectors[self.size : needed] = vectors
+        self.ids.extend(ids)
+        self.texts.extend(texts)
+
+        if self.centroids is not None:
+            nearest = np.argmax(vectors @ self.centroids.T, axis=1)
+            for offset, cluster in enumerate(nearest):
+                self.lists[cluster].append(self.size + offset)
+        self.size = needed
+        self.dirty = True
+
+        if self.size >= settings.RECALL_IVF_MIN_SIZE and self.size >= 2 * self.trained_size:
+            self.train()
+
+    def snapshot(self) -> Tuple[np.ndarray, List[str], List[str]]:
+        """Copies of the vectors, ids and texts that stay aligned while ``add`` goes on."""
+        return self.vectors[: self.size].copy(), list(self.ids), list(self.texts)
+
+    def train(self, iterations: int = 10):
+        """(Re)build the IVF index with a few rounds of spherical k-means."""
+        data = self.vectors[: self.size]
+        nlist = max(1, int(np.sqrt(self.size)))
+        rng = np.random.default_rng(0)
+        centroids = data[rng.choice(self.size, nlist, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(data @ centroids.T, axis=1)
+            for cluster in range(nlist):
+                members = data[assignment == cluster]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[cluster] = centroid / max(np.linalg.norm(centroid), 1e-12)
+        assignment = np.argmax(data @ centroids.T, axis=1)
+        self.centroids = centroids
+        self.lists = [np.flatnonzero(assignment == c).tolist() for c in range(nlist)]
+        self.trained_size = self.size
+
+    def search(self, query: np.ndarray, k: int) -> List[str]:
+        if not self.size:
+            return []
+        if self.centroids is None:
+            candidates = np.arange(self.size)
+        else:
+            nprobe = min(settings.RECALL_IVF_NPROBE, len(self.centroids))
+            probe = np.argpartition(self.centroids @ query, -nprobe)[-nprobe:]
+            candidates = np.fromiter(
+                (i for cluster in probe for i in self.lists[cluster]), dtype=np.int64
+            )
+            if not len(candidates):
+                return []
+        scores = self.vectors[candidates] @ query
+        k = min(k, len(candidates))
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [self.texts[candidates[i]] for i in top]
+
+
+class LocalRecallStore(RecallStore):
+    """Per-user numpy partitions, loaded on first use and snapshotted to ``directory``."""
+
+    def __init__(self, directory: str, dims: int):
+        self.directory = directory
+        self.dims = dims
+        self._partitions: Dict[str, _Partition] = {}
+        self._lock = asyncio.Lock()
+
+    def _path(self, user_id: str) -> str:
+        digest = hashlib.sha256(user_id.encode()).hexdigest()
+        return os.path.join(self.directory, digest)
+
+    def _load(self, user_id: str) -> _Partition:
+        partition = _Partition(self.dims)
+        path = self._path(user_id)
+        if os.path.exists(f"{path}.npy"):
+            vectors = np.load(f"{path}.npy")
+            with open(f"{path}.json") as f:
+                meta = json.load(f)
+            partition.add(meta["ids"], meta["texts"], vectors)
+            partition.dirty = False
+        return partition
+
+    def _save(self, user_id: str, vectors: np.ndarray, ids: List[str], texts: List[str]):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(user_id)
+        # Write to temp files and rename so a crash never leaves a torn snapshot
+        with open(f"{path}.tmp.npy", "wb") as f:
+            np.save(f, vectors)
+        with open(f"{path}.tmp.json", "w") as f:
+            json.dump({"ids": ids, "texts": texts}, f)
+        os.replace(f"{path}.tmp.npy", f"{path}.npy")
+        os.replace(f"{path}.tmp.json", f"{path}.json")
+
+    async def _partition(self, user_id: str) -> _Partition:
+        partition = self._partitions.get(user_id)
+        if partition is None:
+            async with self._lock:
+                partition = self._partitions.get(user_id)
+                if partition is None:
+                    partition = await asyncio.to_thread(self._load, user_id)
+                    self._partitions[user_id] = partition
+        return partition
+
+    async def add(self, user_id: str, texts: List[str]) -> List[str]:
+        vectors = await embed(texts)
+        ids = [str(uuid.uuid4()) for _ in texts]
+        partition = await self._partition(user_id)
+        async with self._lock:
+            partition.add(ids, texts, vectors)
+        return ids
+
+    async def search(self, user_id: str, query: str, k: int = 3) -> List[str]:
+        vector = (await embed([query]))[0]
+        return (await self._partition(user_id)).search(vector, k)
+
+    async def flush(self):
+        """Snapshot every partition changed since the last flush."""
+        for user_id, partition in list(self._partitions.items()):
+            if not partition.dirty:
+                continue
+            # Copied under the lock, written off-thread: add() keeps appending
+            # to the live partition while the files are written
+            async with self._lock:
+                snapshot = partition.snapshot()
+                partition.dirty = False
+            try:
+                await asyncio.to_thread(self._save, user_id, *snapshot)
+            except Exception:
+                partition.dirty = True
+                raise
+
+    async def run_snapshots(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Recall snapshot failed")
+
+
+class PgVectorRecallStore(RecallStore):
+    """Recall memories in Postgres, searched through a pgvector HNSW index."""
+
+    def __init__(self, pool: AsyncConnectionPool, dims: int):
+        self.pool = pool
+        self.dims = dims
+
+    async def setup(self):
+        async with self.pool.connection() as conn:
+            await conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+            await conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS recall_memories (
+                    id uuid PRIMARY KEY,
+                    user_id text NOT NULL,
+                    content text NOT NULL,
+                    embedding vector({self.dims}) NOT NULL,
+                    created_at timestamptz NOT NULL DEFAULT now()
+                )
+                """
+            )
+            await conn.execute(
+                "CREATE INDEX IF NOT EXISTS recall_memories_user_idx ON recall_memories (user_id)"
+            )
+            await conn.execute(
+                "CREATE INDEX IF NOT EXISTS recall_memories_embedding_idx "
+                "ON recall_memories USING hnsw (embedding vector_cosine_ops)"
+            )
+
+    async def add(self, user_id: str, texts: List[str]) -> List[str]:
+        vectors = await embed(texts)
+        ids = [str(uuid.uuid4()) for _ in texts]
+        async with self.pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.executemany(
+                    "INSERT INTO recall_memories (id, user_id, content, embedding) "
+                    "VALUES (%s, %s, %s, %s::vector)",
+                    [
+                        (id_, user_id, text, str(vector.tolist()))
+                        for id_, text, vector in zip(ids, texts, vectors)
+                    ],
+                )
+        return ids
+
+    async def search(self, user_id: str, query: str, k: int = 3) -> List[str]:
+        vector = (await embed([query]))[0]
+        async with self.pool.connection() as conn:
+            rows = await (
+                await conn.execute(
+                    "SELECT content FROM recall_memories WHERE user_id = %s "
+                    "ORDER BY embedding <=> %s::vector LIMIT %s",
+                    (user_id, str(vector.tolist()), k),
+                )
+            ).fetchall()
+        return [row["content"] for row in rows]
+
+
+_recall_store: Optional[RecallStore] = None
+
+
+def create_recall_store(pool: Optional[AsyncConnectionPool] = None) -> RecallStore:
+    if settings.RECALL_BACKEND == "pgvector":
+        return PgVectorRecallStore(pool, settings.EMBEDDING_DIMS)
+    return LocalRecallStore(settings.RECALL_SNAPSHOT_DIR, settings.EMBEDDING_DIMS)
+
+
+def set_recall_store(store: RecallStore):
+    global _recall_store
+    _recall_store = store
+
+
+def get_recall_store() -> RecallStore:
+    # Falls back to a local store when used outside the app (scripts, notebooks)
+    if _recall_store is None:
+        set_recall_store(create_recall_store())
+    return _recall_store
@@ -0,0 +1,91 @@
+import asyncio
+import re
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from psycopg_pool import AsyncConnectionPool
+
+
+def generate_thread_id(user_id: str) -> str:
+    # The random suffix keeps threads started in the same second apart
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    return f"{user_id}-{timestamp}-{uuid.uuid4().hex[:8]}"
+
+
+# What generate_thread_id appends to the user id; older ids have no suffix
+_THREAD_SUFFIX = re.compile(r"-\d{14}(-[0-9a-f]{8})?")
+
+# First key of the two-key advisory locks taken per thread (second: hashtext)
+THREAD_LOCK_CLASS = 0x7468
+
+
+def owns_thread(user_id: str, thread_id: str) -> bool:
+    """Whether ``thread_id`` was generated for ``user_id``.
+
+    The whole remainder must match, so "alice" does not own the threads
+    of a user called "alice-bob".
+    """
+    return thread_id.startswith(f"{user_id}-") and bool(
+        _THREAD_SUFFIX.fullmatch(thread_id, len(user_id))
+    )
+
+
+class ThreadLocks:
+    """Per-thread asyncio locks, created on demand and dropped when unused.
+
+    Anything that writes a checkpoint for a thread (a chat turn, a background
+    state update) takes the thread's lock so writes never interleave and fork
+    the checkpoint history.
+
+    The asyncio lock only serializes within one process. With ``use_pool``
+    the holder also takes a Postgres transaction-level advisory lock on a
+    pooled connection, so workers and replicas serialize too; the local lock
+    stays in front so only one connection per thread is pinned per process.
+    At most half the pool is pinned this way, leaving the rest for the
+    checkpoint reads and writes the holders are waiting to make.
+    """
+
+    def __init__(self):
+        # thread_id -> [lock, number of holders/waiters]
+        self._locks: Dict[str, List] = {}
+        self._pool: Optional[AsyncConnectionPool] = None
+        self._pinned: Optional[asyncio.Semaphore] = None
+
+    def use_pool(self, pool: Optional[AsyncConnectionPool]):
+        self._pool = pool
+        self._pinned = asyncio.Semaphore(max(1, pool.max_size // 2)) if pool else None
+
+    @asynccontextmanager
+    async def hold(self, thread_id: str):
+        entry = self._locks.setdefault(thread_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                if self._pool is None:
+                    yield
+                else:
+                    async with self._pinned, self._pool.connection() as conn:
+                        # Released when the transaction ends, even on error
+                        async with conn.transaction():
+                            await conn.execute(
+                                "SELECT pg_advisory_xact_lock(%s, hashtext(%s))",
+                                (THREAD_LOCK_CLASS, thread_id),
+                            )
+                            yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[thread_id]
+
+    def pending(self, thread_id: str) -> int:
+        """Turns holding or waiting for the thread's lock."""
+        entry = self._locks.get(thread_id)
+        return entry[1] if entry else 0
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+thread_locks = ThreadLocks()
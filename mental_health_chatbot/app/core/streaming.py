@@ -0,0 +1,104 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+from fastapi import WebSocket
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langgraph.graph.state import CompiledStateGraph
+
+from app.core.encoding import Frame, dumps
+
+
+class TurnStream:
+    """One chat turn as an async iterator of reply text deltas.
+
+    Shared by the WebSocket and SSE transports. Once iteration finishes,
+    ``state`` holds the final graph state and ``reply`` the merged model
+    message (with its usage metadata when the provider reports it).
+    """
+
+    def __init__(self, graph: CompiledStateGraph, user_input: str, config):
+        self.graph = graph
+        self.user_input = user_input
+        self.config = config
+        self.state = None
+        self.reply: Optional[AIMessage] = None
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        async for mode, payload in self.graph.astream(
+            {"messages": [{"role": "user", "content": self.user_input}]},
+            self.config,
+            stream_mode=["messages", "values"],
+        ):
+            if mode == "values":
+                self.state = payload
+                continue
+
+            message, metadata = payload
+            if metadata.get("langgraph_node") != "call_model":
+                continue
+            if isinstance(message, AIMessageChunk):
+                self.reply = message if self.reply is None else self.reply + message
+            elif isinstance(message, AIMessage):
+                # Node output that was not produced token by token
+                self.reply = message
+            else:
+                continue
+            if message.content:
+                yield message.content
+
+    @property
+    def response(self) -> str:
+        return self.state["messages"][-1].content if self.state else ""
+
+    @property
+    def usage(self) -> Optional[dict]:
+        return getattr(self.reply, "usage_metadata", None)
+
+
+class DeltaSender:
+    """Pushes token deltas to one WebSocket without letting a slow reader stall the model.
+
+    Tokens are buffered as they arrive and a single writer task flushes
+    everything accumulated since its previous send as one ``delta`` frame, so a
+    client that reads slowly simply receives fewer, larger frames while the
+    buffer never outgrows the reply itself.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        send: Callable[[Frame, WebSocket], Awaitable[None]],
+    ):
+        self._websocket = websocket
+        self._send = send
+        self._buffer: List[str] = []
+        self._ready = asyncio.Event()
+        self._closed = False
+        self._task = asyncio.create_task(self._run())
+
+    def push(self, text: str):
+        # Surface a dead socket to the producer instead of buffering forever
+        if self._task.done():
+            self._task.result()
+        self._buffer.append(text)
+        self._ready.set()
+
+    async def _run(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            if self._buffer:
+                text = "".join(self._buffer)
+                self._buffer.clear()
+                await self._send(dumps({"type": "delta", "content": text}), self._websocket)
+            if self._closed and not self._buffer:
+                return
+
+    async def aclose(self):
+        """Flush whatever is still buffered and stop the writer task."""
+        self._closed = True
+        self._ready.set()
+        await self._task
+
+    def cancel(self):
+        self._task.cancel()
@@ -1,147 +1,411 @@
-import json
+import asyncio
 import logging
-from collections import defaultdict
-from datetime import date, datetime
-from typing import Dict, List, Optional
+import time
+from typing import Dict, Optional, Set
 
 from fastapi import WebSocket, WebSocketDisconnect, status
-from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
-from langgraph.graph import END, START, MessagesState, StateGraph
-from langgraph.store.postgres.aio import AsyncPostgresStore
+from langgraph.graph.state import CompiledStateGraph
 
-from app.core.chatbot.chatbot_workflow import call_model, update_memory
-from app.db.connection import  database_url
+from app.core.broker import Broker, InProcessBroker
+from app.core.chatbot.memory_worker import memory_queue
+from app.core.config import settings
+from app.core.encoding import Frame, dumps, loads
+from app.core.lifecycle import lifecycle
+from app.core.metrics import active_connections, stage, trace_turn
+from app.core.ratelimit import get_guest_limiter, guest_limit_key
+from app.core.sessions import generate_thread_id, owns_thread, thread_locks
+from app.core.streaming import DeltaSender, TurnStream
 from app.middleware.auth import get_current_user_id
 
 
+PING = dumps({"type": "ping"})
+PONG = dumps({"type": "pong"})
+BUSY = dumps(
+    {"type": "busy", "message": "Still answering your previous messages, please wait."}
+)
+
+
+def control_frame(text: str) -> Optional[str]:
+    """The ``type`` of a ping/pong heartbeat frame, None for chat input."""
+    if not text.startswith("{"):
+        return None
+    try:
+        frame = loads(text)
+    except ValueError:
+        return None
+    if isinstance(frame, dict) and frame.get("type") in ("ping", "pong"):
+        return frame["type"]
+    return None
+
+
+class ConnectionRecord:
+    __slots__ = ("websocket", "user_id", "connected_at", "last_activity")
+
+    def __init__(self, websocket: WebSocket, user_id: str):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.connected_at = self.last_activity = time.monotonic()
+
+
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = {}
+    """Open sockets per user, bounded and optionally reaped when idle.
 
-    async def connect(self, websocket: WebSocket, user_id: str):
+    Liveness is normally left to the server's protocol-level pings. With
+    ``idle_timeout`` set, sockets quiet for ``heartbeat_interval`` also get an
+    app-level ping frame and are closed once silent for ``idle_timeout``,
+    even when no clean disconnect ever arrives; this suits clients that
+    answer with a pong frame. A user over ``max_per_user`` loses
+    their idlest socket; past ``max_connections`` new sockets are refused
+    with 1013 (try again later).
+    """
+
+    # Seconds a heartbeat or close frame may take before the peer is given up on
+    SEND_TIMEOUT = 5.0
+
+    def __init__(
+        self,
+        broker: Optional[Broker] = None,
+        max_connections: int = settings.WS_MAX_CONNECTIONS,
+        max_per_user: int = settings.WS_MAX_CONNECTIONS_PER_USER,
+        heartbeat_interval: float = settings.WS_HEARTBEAT_INTERVAL,
+        idle_timeout: float = settings.WS_IDLE_TIMEOUT,
+        binary_frames: bool = settings.WS_BINARY_FRAMES,
+    ):
+        self.active_connections: Dict[str, Set[ConnectionRecord]] = {}
+        # id(websocket) -> record; WebSocket objects are not hashable
+        self._records: Dict[int, ConnectionRecord] = {}
+        self.broker = broker or InProcessBroker()
+        self.max_connections = max_connections
+        self.max_per_user = max_per_user
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.binary_frames = binary_frames
+        self._reaper: Optional[asyncio.Task] = None
+        self._rejected = 0
+        self._evicted = 0
+        self._reaped = 0
+        self._busy = 0
+
+    async def start(self, broker: Broker):
+        """Swap in the shared broker, start receiving other workers' messages and reaping."""
+        self.broker = broker
+        await broker.start(self.deliver_local)
+        if self.idle_timeout > 0:
+            self._reaper = asyncio.create_task(self._run_reaper())
+
+    async def stop(self):
+        if self._reaper:
+            self._reaper.cancel()
+        await self.broker.stop()
+
+    async def connect(self, websocket: WebSocket, user_id: str) -> Optional[ConnectionRecord]:
         await websocket.accept()
-        self.active_connections.setdefault(user_id, []).append(websocket)
+        if len(self._records) >= self.max_connections:
+            self._rejected += 1
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+            return None
+
+        records = self.active_connections.setdefault(user_id, set())
+        if len(records) >= self.max_per_user:
+            idlest = min(records, key=lambda r: r.last_activity)
+            self._evicted += 1
+            await self._close(idlest, status.WS_1008_POLICY_VIOLATION)
+
+        record = ConnectionRecord(websocket, user_id)
+        self.active_connections.setdefault(user_id, set()).add(record)
+        self._records[id(websocket)] = record
+        return record
 
     async def disconnect(self, websocket: WebSocket, user_id: str):
-        if user_id in self.active_connections:
-            self.active_connections[user_id].remove(websocket)
-            if not self.active_connections[user_id]:
+        record = self._records.pop(id(websocket), None)
+        if record is None:
+            return
+        records = self.active_connections.get(user_id)
+        if records is not None:
+            records.discard(record)
+            if not records:
                 del self.active_connections[user_id]
 
-    async def send_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+    def touch(self, websocket: WebSocket):
+        record = self._records.get(id(websocket))
+        if record is not None:
+            record.last_activity = time.monotonic()
+
+    async def _send(self, websocket: WebSocket, message: Frame):
+        if self.binary_frames:
+            await websocket.send_bytes(message if isinstance(message, bytes) else message.encode())
+        else:
+            await websocket.send_text(message if isinstance(message, str) else message.decode())
+
+    async def send_message(self, message: Frame, websocket: WebSocket):
+        await self._send(websocket, message)
+        self.touch(websocket)
+
+    async def send_busy(self, websocket: WebSocket):
+        self._busy += 1
+        await self.send_message(BUSY, websocket)
+
+    async def deliver_local(self, user_id: str, message: str):
+        for record in list(self.active_connections.get(user_id, ())):
+            await self._send(record.websocket, message)
 
     async def broadcast_to_user(self, message: str, user_id: str):
-        for ws in self.active_connections.get(user_id, []):
-            await ws.send_text(message)
+        # The user may have sockets open on other workers too
+        await self.deliver_local(user_id, message)
+        await self.broker.publish(user_id, message)
+
+    async def _close(self, record: ConnectionRecord, code: int):
+        await self.disconnect(record.websocket, record.user_id)
+        try:
+            await asyncio.wait_for(record.websocket.close(code=code), self.SEND_TIMEOUT)
+        except Exception:
+            # Already gone; the receive loop sees the disconnect
+            pass
+
+    async def reap(self):
+        """Close sockets idle past the timeout and ping the ones going quiet.
+
+        Sockets are handled concurrently and every send is bounded by
+        ``SEND_TIMEOUT``, so a peer that stopped reading cannot hold up the
+        sweep for everyone else.
+        """
+        now = time.monotonic()
+        await asyncio.gather(
+            *(self._reap_one(record, now) for record in list(self._records.values()))
+        )
+
+    async def _reap_one(self, record: ConnectionRecord, now: float):
+        idle = now - record.last_activity
+        if idle >= self.idle_timeout:
+            self._reaped += 1
+            await self._close(record, status.WS_1001_GOING_AWAY)
+        elif idle >= self.heartbeat_interval:
+            try:
+                await asyncio.wait_for(self._send(record.websocket, PING), self.SEND_TIMEOUT)
+            except Exception:
+                self._reaped += 1
+                await self._close(record, status.WS_1001_GOING_AWAY)
+
+    async def _run_reaper(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.reap()
+            except Exception:
+                logger.exception("Connection reaper failed")
+
+    async def close_all(self, code: int = status.WS_1012_SERVICE_RESTART):
+        for record in list(self._records.values()):
+            await self._close(record, code)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def stats(self) -> dict:
+        return {
+            "connections": len(self._records),
+            "users": len(self.active_connections),
+            "max_connections": self.max_connections,
+            "rejected": self._rejected,
+            "evicted": self._evicted,
+            "reaped": self._reaped,
+            "busy": self._busy,
+            "broker": self.broker.stats(),
+        }
 
 
 logger = logging.getLogger("chatbot")
 manager = ConnectionManager()
+active_connections.function = lambda: len(manager)
 
 
-def generate_thread_id(user_id: str) -> str:
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    return f"{user_id}-{timestamp}"
+async def stream_reply(graph: CompiledStateGraph, user_input: str, config, websocket: WebSocket):
+    """Run one turn pushing ``delta`` frames as tokens arrive, then a ``done`` frame.
 
+    Returns the final graph state of the turn.
+    """
+    sender = DeltaSender(websocket, manager.send_message)
+    turn = TurnStream(graph, user_input, config)
+    try:
+        async for delta in turn:
+            sender.push(delta)
+        await sender.aclose()
+    except BaseException:
+        sender.cancel()
+        raise
 
-# In-memory guest chat counter (reset daily)
-guest_chat_counter = defaultdict(int)
-guest_chat_date = date.today()
+    await manager.send_message(
+        dumps({"type": "done", "response": turn.response, "usage": turn.usage}),
+        websocket,
+    )
+    return turn.state
 
-async def websocket_endpoint(websocket: WebSocket):
-    global guest_chat_counter, guest_chat_date
 
-    # Reset guest counter if day changed
-    if guest_chat_date != date.today():
-        guest_chat_counter = defaultdict(int)
-        guest_chat_date = date.today()
+async def receive_messages(websocket: WebSocket, pending: asyncio.Queue):
+    """Read frames until the client goes away, queueing chat messages.
 
-    user_id = await get_current_user_id(websocket)
-    if not user_id:
-        return  # Connection already closed in get_current_user_id
+    Heartbeats are answered here, so they never wait behind a running turn.
+    A message that finds the session's queue full is refused with a ``busy``
+    frame rather than piling up.
+    """
+    while True:
+        user_input = await websocket.receive_text()
+        manager.touch(websocket)
+        if not user_input:
+            continue
+        frame = control_frame(user_input)
+        if frame == "ping":
+            await manager.send_message(PONG, websocket)
+        if frame:
+            continue
+        try:
+            pending.put_nowait(user_input)
+        except asyncio.QueueFull:
+            await manager.send_busy(websocket)
 
+
+async def process_messages(
+    websocket: WebSocket,
+    graph: CompiledStateGraph,
+    user_id: str,
+    config,
+    pending: asyncio.Queue,
+):
+    """Run the session's queued messages one turn at a time, until a None arrives."""
+    thread_id = config["configurable"]["thread_id"]
+    stream = config["configurable"]["stream"]
     is_guest = user_id.startswith("guest-")
 
-    await manager.connect(websocket, user_id)
+    while (user_input := await pending.get()) is not None:
+        try:
+            if lifecycle.draining:
+                # Let the client resume the thread on another worker
+                await websocket.close(code=status.WS_1012_SERVICE_RESTART)
+                return
+
+            # Guest chat limit logic
+            if is_guest:
+                if not await get_guest_limiter().hit(guest_limit_key(user_id)):
+                    await manager.send_message(
+                        dumps({
+                            "response": f"Guest users are limited to {settings.GUEST_CHAT_LIMIT} chats per day. Please sign in for unlimited access."
+                        }),
+                        websocket,
+                    )
+                    await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                    return
+
+            # Other sockets on the same thread may already be queued
+            if thread_locks.pending(thread_id) >= settings.THREAD_MAX_PENDING:
+                await manager.send_busy(websocket)
+                continue
+
+            async with lifecycle.turn(), thread_locks.hold(thread_id):
+                with trace_turn("websocket", user_id, thread_id):
+                    if stream:
+                        await stream_reply(graph, user_input, config, websocket)
+                    else:
+                        response = ""
+
+                        async for chunk in graph.astream(
+                            {"messages": [{"role": "user", "content": user_input}]},
+                            config,
+                            stream_mode="values",
+                        ):
+                            response = chunk["messages"][-1].content
+
+                        await manager.send_message(
+                            dumps(
+                                {
+                                    "response": response,
+                                }
+                            ),
+                            websocket,
+                        )
+
+            # Memory extraction runs in the background workers
+            memory_queue.submit(config)
 
+        except Exception as e:
+            logger.exception("Chatbot error")
+            try:
+                await manager.send_message(
+                    dumps({"type": "error", "message": str(e)}), websocket
+                )
+            except Exception:
+                return  # Socket is gone
+
+
+async def websocket_endpoint(websocket: WebSocket, graph: CompiledStateGraph):
+    with stage("auth"):
+        user_id = await get_current_user_id(websocket)
+    if not user_id:
+        # Closing before accept() rejects the handshake itself (HTTP 403)
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    thread_id: Optional[str] = websocket.query_params.get("thread_id")
+    if thread_id and not owns_thread(user_id, thread_id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    thread_id = thread_id or generate_thread_id(user_id)
+
+    if lifecycle.draining:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+
+    if await manager.connect(websocket, user_id) is None:
+        return  # Over the connection cap, already closed
+
+    tasks = []
     try:
         query_params = websocket.query_params
-        thread_id: Optional[str] = query_params.get("thread_id") or generate_thread_id(
-            user_id
-        )
         logger.info(f"User {user_id} connected with thread_id: {thread_id}")
 
-        config = {"configurable": {"user_id": user_id, "thread_id": thread_id}}
-
-        # Use pooled engine
-        async with AsyncPostgresStore.from_conn_string(database_url) as store, \
-                   AsyncPostgresSaver.from_conn_string(database_url) as checkpointer:
-            builder = StateGraph(MessagesState)
-            builder.add_node("call_model", call_model)
-            builder.add_edge(START, "call_model")
-            builder.add_edge("call_model", END)
-
-            graph = builder.compile(checkpointer=checkpointer, store=store)
-
-            while True:
-                try:
-                    user_input = await websocket.receive_text()
-                    if not user_input:
-                        continue
-
-                    # Guest chat limit logic
-                    if is_guest:
-                        guest_chat_counter[user_id] += 1
-                        if guest_chat_counter[user_id] > 10:
-                            await manager.send_message(
-                                json.dumps({
-                                    "response": "Guest users are limited to 10 chats per day. Please sign in for unlimited access."
-                                }),
-                                websocket,
-                            )
-                            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-                            await manager.disconnect(websocket, user_id)
-                            break
-
-                    response = ""
-                    theState = None
-
-                    async for chunk in graph.astream(
-                        {"messages": [{"role": "user", "content": user_input}]},
-                        config,
-                        stream_mode="values",
-                    ):
-                        response = chunk["messages"][-1].content
-                        theState = chunk
+        # ?stream=true switches the socket to incremental delta/done frames
+        stream = query_params.get("stream", "").lower() in ("1", "true", "yes")
 
-                    await manager.send_message(
-                        json.dumps(
-                            {
-                                "response": response,
-                            }
-                        ),
-                        websocket,
-                    )
-
-                    await update_memory(state=theState, config=config, store=store)
+        config = {
+            "configurable": {"user_id": user_id, "thread_id": thread_id, "stream": stream}
+        }
 
-                except WebSocketDisconnect:
-                    logger.info(f"User {user_id} disconnected")
-                    await manager.disconnect(websocket, user_id)
-                    break
+        # Reading and answering are separate tasks: messages sent while a
+        # turn runs wait in a small queue and are answered strictly in order
+        pending = asyncio.Queue(maxsize=settings.SESSION_MAX_PENDING)
+        reader = asyncio.create_task(receive_messages(websocket, pending))
+        processor = asyncio.create_task(
+            process_messages(websocket, graph, user_id, config, pending)
+        )
+        tasks = [reader, processor]
+        await asyncio.wait({reader, processor}, return_when=asyncio.FIRST_COMPLETED)
 
-                except Exception as e:
-                    logger.exception("Chatbot error")
-                    await manager.send_message(
-                        json.dumps({"type": "error", "message": str(e)}), websocket
-                    )
+        if reader.done():
+            # Client went away: finish the running turn, drop queued messages
+            while not pending.empty():
+                pending.get_nowait()
+            pending.put_nowait(None)
+            await processor
+            error = reader.exception()
+            if isinstance(error, WebSocketDisconnect):
+                logger.info(f"User {user_id} disconnected")
+            elif error is not None:
+                raise error
+        else:
+            # The processor closed the socket (guest limit, drain)
+            reader.cancel()
+            processor.result()
     except Exception as e:
         logger.exception("Fatal error in WebSocket lifecycle")
         try:
             await manager.send_message(
-                json.dumps({"type": "fatal_error", "message": str(e)}), websocket
+                dumps({"type": "fatal_error", "message": str(e)}), websocket
             )
         except Exception:
             pass
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()  # Retrieved, so it is not reported as unhandled
         await manager.disconnect(websocket, user_id)
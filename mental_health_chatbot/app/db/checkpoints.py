@@ -0,0 +1,334 @@
+"""Checkpoint retention: compaction of long threads and archiving of cold ones.
+
+Every turn adds a checkpoint (plus the channel blobs and pending writes it
+references), so long conversations keep thousands of rows nobody reads:
+turns only ever load the latest checkpoint. Compaction keeps the newest
+``keep`` checkpoints of a thread and drops the writes and blobs no kept
+checkpoint references. Threads idle for longer than ``archive_after`` are
+moved, rows and all, into one zstd-compressed row of ``checkpoint_archive``
+and restored transparently by ``ArchivingPostgresSaver`` the next time the
+thread is loaded.
+
+Every worker schedules retention, but a run only proceeds on the one that
+wins the ``RETENTION_LOCK`` advisory lock, and each thread is compacted or
+archived under its ``thread_locks`` advisory lock so it cannot race a turn
+resuming the thread in another process.
+
+Runs periodically from the app lifespan, or by hand:
+    python -m app.db.checkpoints [--thread THREAD_ID] [--no-archive]
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import ormsgpack
+import zstandard
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import CheckpointTuple, get_checkpoint_id
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from psycopg import Rollback, sql
+from psycopg.types.json import Jsonb
+from psycopg_pool import AsyncConnectionPool
+
+from app.core.config import settings
+from app.core.metrics import stage
+from app.core.sessions import thread_locks
+from app.db.connection import create_pool
+
+logger = logging.getLogger(__name__)
+
+# Archived in this order and restored in the same order
+TABLES = ("checkpoints", "checkpoint_blobs", "checkpoint_writes")
+JSONB_COLUMNS = {"checkpoint", "metadata"}
+# Advisory lock held by the single worker running retention
+RETENTION_LOCK = 0x636B7074
+
+
+class CheckpointCompactor:
+    def __init__(
+        self,
+        pool: AsyncConnectionPool,
+        keep: int = settings.CHECKPOINT_KEEP,
+        archive_after: float = settings.CHECKPOINT_ARCHIVE_AFTER_DAYS,
+        batch: int = settings.CHECKPOINT_COMPACTION_BATCH,
+    ):
+        self.pool = pool
+        self.keep = keep
+        self.archive_after = archive_after
+        self.batch = batch
+        self._compressor = zstandard.ZstdCompressor(level=10)
+        self._decompressor = zstandard.ZstdDecompressor()
+        self._compacted = 0
+        self._archived = 0
+        self._restored = 0
+        self._skipped = 0
+        self._last_run_seconds = 0.0
+
+    async def setup(self):
+        async with self.pool.connection() as conn:
+            await conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS checkpoint_archive (
+                    thread_id text PRIMARY KEY,
+                    archived_at timestamptz NOT NULL DEFAULT now(),
+                    rows integer NOT NULL,
+                    data bytea NOT NULL
+                )
+                """
+            )
+
+    async def compact_thread(self, thread_id: str) -> int:
+        """Keep the newest ``keep`` checkpoints of the thread; returns rows deleted."""
+        if not self.keep:
+            return 0
+        async with thread_locks.hold(thread_id):
+            async with self.pool.connection() as conn, conn.transaction():
+                deleted = (
+                    await conn.execute(
+                        """
+                        DELETE FROM checkpoints c
+                        WHERE c.thread_id = %(thread)s
+                          AND c.checkpoint_id < (
+                              SELECT checkpoint_id FROM checkpoints
+                              WHERE thread_id = %(thread)s AND checkpoint_ns = c.checkpoint_ns
+                              ORDER BY checkpoint_id DESC
+                              OFFSET %(keep)s - 1 LIMIT 1
+                          )
+                        """,
+                        {"thread": thread_id, "keep": self.keep},
+                    )
+                ).rowcount
+                if not deleted:
+                    return 0
+                deleted += (
+                    await conn.execute(
+                        """
+                        DELETE FROM checkpoint_writes w
+                        WHERE w.thread_id = %s AND NOT EXISTS (
+                            SELECT 1 FROM checkpoints c
+                            WHERE c.thread_id = w.thread_id
+                              AND c.checkpoint_ns = w.checkpoint_ns
+                              AND c.checkpoint_id = w.checkpoint_id
+                        )
+                        """,
+                        (thread_id,),
+                    )
+                ).rowcount
+                deleted += (
+                    await conn.execute(
+                        """
+                        DELETE FROM checkpoint_blobs b
+                        WHERE b.thread_id = %s AND NOT EXISTS (
+                            SELECT 1 FROM checkpoints c
+                            WHERE c.thread_id = b.thread_id
+                              AND c.checkpoint_ns = b.checkpoint_ns
+                              AND c.checkpoint -> 'channel_versions' ->> b.channel = b.version
+                        )
+                        """,
+                        (thread_id,),
+                    )
+                ).rowcount
+        self._compacted += 1
+        return deleted
+
+    async def archive_thread(self, thread_id: str) -> bool:
+        """Move every checkpoint row of the thread into ``checkpoint_archive``."""
+        await self.compact_thread(thread_id)
+        async with thread_locks.hold(thread_id):
+            async with self.pool.connection() as conn, conn.transaction():
+                rows: Dict[str, List[Dict[str, Any]]] = {}
+                for table in TABLES:
+                    rows[table] = await (
+                        await conn.execute(
+                            sql.SQL("DELETE FROM {} WHERE thread_id = %s RETURNING *").format(
+                                sql.Identifier(table)
+                            ),
+                            (thread_id,),
+                        )
+                    ).fetchall()
+                if not rows["checkpoints"]:
+                    return False
+                data = await asyncio.to_thread(
+                    self._compressor.compress, ormsgpack.packb(rows)
+                )
+                inserted = await (
+                    await conn.execute(
+                        """
+                        INSERT INTO checkpoint_archive (thread_id, rows, data)
+                        VALUES (%s, %s, %s)
+                        ON CONFLICT (thread_id) DO NOTHING
+                        RETURNING thread_id
+                        """,
+                        (thread_id, sum(len(r) for r in rows.values()), data),
+                    )
+                ).fetchone()
+                if inserted is None:
+                    # Already archived: keep the rows rather than lose either copy
+                    logger.warning(f"Thread {thread_id} already has an archive; not archiving")
+                    raise Rollback()
+        if inserted is None:
+            return False
+        self._archived += 1
+        return True
+
+    async def restore_thread(self, thread_id: str) -> bool:
+        """Put an archived thread back into the checkpoint tables; False if not archived."""
+        async with self.pool.connection() as conn, conn.transaction():
+            # Concurrent restores wait on the row lock and then find nothing
+            archived = await (
+                await conn.execute(
+                    "DELETE FROM checkpoint_archive WHERE thread_id = %s RETURNING data",
+                    (thread_id,),
+                )
+            ).fetchone()
+            if archived is None:
+                return False
+            rows = ormsgpack.unpackb(
+                await asyncio.to_thread(self._decompressor.decompress, archived["data"])
+            )
+            for table in TABLES:
+                for row in rows.get(table, ()):
+                    columns = list(row)
+                    await conn.execute(
+                        sql.SQL("INSERT INTO {} ({}) VALUES ({}) ON CONFLICT DO NOTHING").format(
+                            sql.Identifier(table),
+                            sql.SQL(", ").join(map(sql.Identifier, columns)),
+                            sql.SQL(", ").join(sql.Placeholder() * len(columns)),
+                        ),
+                        [Jsonb(row[c]) if c in JSONB_COLUMNS else row[c] for c in columns],
+                    )
+        self._restored += 1
+        logger.info(f"Restored archived thread {thread_id}")
+        return True
+
+    async def run_once(self):
+        started = time.perf_counter()
+        async with self.pool.connection() as conn:
+            long_threads = []
+            if self.keep:
+                long_threads = await (
+                    await conn.execute(
+                        """
+                        SELECT thread_id FROM checkpoints
+                        GROUP BY thread_id HAVING count(*) > %s LIMIT %s
+                        """,
+                        (self.keep, self.batch),
+                    )
+                ).fetchall()
+            cold_threads = []
+            if self.archive_after:
+                cutoff = datetime.now(timezone.utc) - timedelta(days=self.archive_after)
+                cold_threads = await (
+                    await conn.execute(
+                        """
+                        SELECT thread_id FROM checkpoints
+                        GROUP BY thread_id HAVING max(checkpoint ->> 'ts') < %s LIMIT %s
+                        """,
+                        (cutoff.isoformat(), self.batch),
+                    )
+                ).fetchall()
+
+        cold = {row["thread_id"] for row in cold_threads}
+        for row in long_threads:
+            if row["thread_id"] not in cold:
+                await self.compact_thread(row["thread_id"])
+        for thread_id in cold:
+            await self.archive_thread(thread_id)
+        self._last_run_seconds = time.perf_counter() - started
+        logger.info(
+            f"Checkpoint retention: compacted {len(long_threads)}, archived {len(cold)} "
+            f"threads in {self._last_run_seconds:.2f}s"
+        )
+
+    async def run_as_leader(self) -> bool:
+        """``run_once`` unless another process holds ``RETENTION_LOCK``."""
+        async with self.pool.connection() as conn, conn.transaction():
+            leader = await (
+                await conn.execute(
+                    "SELECT pg_try_advisory_xact_lock(%s) AS leader", (RETENTION_LOCK,)
+                )
+            ).fetchone()
+            if not leader["leader"]:
+                self._skipped += 1
+                return False
+            await self.run_once()
+        return True
+
+    async def run(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.run_as_leader()
+            except Exception:
+                logger.exception("Checkpoint retention failed")
+
+    def stats(self) -> dict:
+        return {
+            "keep": self.keep,
+            "archive_after_days": self.archive_after,
+            "compacted": self._compacted,
+            "archived": self._archived,
+            "restored": self._restored,
+            "skipped_runs": self._skipped,
+            "last_run_seconds": round(self._last_run_seconds, 3),
+        }
+
+
+class ArchivingPostgresSaver(AsyncPostgresSaver):
+    """``AsyncPostgresSaver`` that brings archived threads back on first load.
+
+    Only a miss on the latest checkpoint of a thread costs the extra archive
+    lookup, i.e. once per new or archived thread.
+    """
+
+    def __init__(self, conn, compactor: CheckpointCompactor, **kwargs):
+        super().__init__(conn, **kwargs)
+        self.compactor = compactor
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        with stage("checkpoint_read"):
+            found = await super().aget_tuple(config)
+            if found is None and not get_checkpoint_id(config):
+                if await self.compactor.restore_thread(config["configurable"]["thread_id"]):
+                    found = await super().aget_tuple(config)
+        return found
+
+    async def aput(self, config, checkpoint, metadata, new_versions) -> RunnableConfig:
+        with stage("checkpoint_write"):
+            return await super().aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path: str = "") -> None:
+        with stage("checkpoint_write"):
+            await super().aput_writes(config, writes, task_id, task_path)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--thread", help="compact only this thread")
+    parser.add_argument("--no-archive", action="store_true", help="do not archive cold threads")
+    args = parser.parse_args()
+
+    pool = create_pool()
+    await pool.open(wait=True)
+    thread_locks.use_pool(pool)
+    try:
+        compactor = CheckpointCompactor(
+            pool, archive_after=0 if args.no_archive else settings.CHECKPOINT_ARCHIVE_AFTER_DAYS
+        )
+        await compactor.setup()
+        if args.thread:
+            deleted = await compactor.compact_thread(args.thread)
+            logger.info(f"Deleted {deleted} rows from thread {args.thread}")
+        elif not await compactor.run_as_leader():
+            logger.info("Retention is already running in another process")
+    finally:
+        await pool.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -1,8 +1,48 @@
-from sqlalchemy import create_engine
+import logging
+
+from psycopg import AsyncConnection, Error
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
 
 from app.core.config import settings
 
-# Convert your DATABASE_URL to asyncpg format if needed
+logger = logging.getLogger(__name__)
+
 database_url = settings.DATABASE_URL
 
-engine = create_engine(database_url, pool_size=10, max_overflow=20)
+
+async def configure_connection(conn: AsyncConnection):
+    # Filtered vector searches (one user's memories) would otherwise return
+    # fewer than k rows when the HNSW candidates belong to other users.
+    if settings.HNSW_ITERATIVE_SCAN:
+        try:
+            await conn.execute(
+                "SELECT set_config('hnsw.iterative_scan', %s, false)",
+                (settings.HNSW_ITERATIVE_SCAN,),
+            )
+        except Error as e:
+            # Older pgvector rejects the setting; plain HNSW scans still work
+            logger.warning(f"hnsw.iterative_scan not set: {e}")
+
+
+def create_pool() -> AsyncConnectionPool:
+    """Build the application-wide async pool (opened in the app lifespan).
+
+    The connection kwargs are the ones LangGraph's Postgres store and
+    checkpointer expect when they are handed a pool instead of a single
+    connection.
+    """
+    return AsyncConnectionPool(
+        conninfo=database_url,
+        min_size=settings.DB_POOL_MIN_SIZE,
+        max_size=settings.DB_POOL_MAX_SIZE,
+        timeout=settings.DB_POOL_TIMEOUT,
+        max_idle=settings.DB_POOL_MAX_IDLE,
+        kwargs={
+            "autocommit": True,
+            "prepare_threshold": 0,
+            "row_factory": dict_row,
+        },
+        configure=configure_connection,
+        open=False,
+    )
@@ -0,0 +1,81 @@
+"""Move legacy memory rows to the current namespace and index them.
+
+Older releases wrote memories under ``(user_id, "memories")`` as bare JSON
+strings, while reads used ``("memories", user_id)``. This migration creates
+the pgvector tables, re-saves every legacy row under the current namespace
+(merging with anything already there) and backfills embeddings for current
+rows that have none.
+
+Run once per database:  python -m app.db.migrate_memories
+"""
+
+import asyncio
+import logging
+
+from langgraph.store.postgres.aio import AsyncPostgresStore
+
+from app.core.chatbot.memory import (
+    MEMORY_PREFIX,
+    get_memory,
+    load_memory,
+    memory_index_config,
+    merge_memories,
+    save_memory,
+)
+from app.db.connection import create_pool
+
+logger = logging.getLogger(__name__)
+
+LEGACY_SUFFIX = f".{MEMORY_PREFIX}"
+
+
+async def migrate(store: AsyncPostgresStore):
+    async with store.conn.connection() as conn:
+        legacy = await (
+            await conn.execute(
+                "SELECT prefix, key, value FROM store WHERE prefix LIKE %s AND prefix NOT LIKE %s",
+                (f"%{LEGACY_SUFFIX}", f"{MEMORY_PREFIX}.%"),
+            )
+        ).fetchall()
+        unindexed = await (
+            await conn.execute(
+                """
+                SELECT s.prefix, s.key FROM store s
+                LEFT JOIN store_vectors v ON v.prefix = s.prefix AND v.key = s.key
+                WHERE s.prefix LIKE %s AND v.prefix IS NULL
+                """,
+                (f"{MEMORY_PREFIX}.%",),
+            )
+        ).fetchall()
+
+    for row in legacy:
+        user_id = row["prefix"][: -len(LEGACY_SUFFIX)]
+        memory = merge_memories(
+            await get_memory(store, user_id, row["key"]), load_memory(row["value"])
+        )
+        await save_memory(store, user_id, row["key"], memory)
+        await store.adelete((user_id, MEMORY_PREFIX), row["key"])
+    logger.info(f"Moved {len(legacy)} legacy memories")
+
+    for row in unindexed:
+        user_id = row["prefix"][len(MEMORY_PREFIX) + 1 :]
+        await save_memory(
+            store, user_id, row["key"], await get_memory(store, user_id, row["key"])
+        )
+    logger.info(f"Indexed {len(unindexed)} existing memories")
+
+
+async def main():
+    pool = create_pool()
+    await pool.open(wait=True)
+    try:
+        store = AsyncPostgresStore(pool, index=memory_index_config())
+        await store.setup()
+        await migrate(store)
+    finally:
+        await pool.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+"""Checkpoint serializer: msgpack, zstd-compressed above a size threshold.
+
+LangGraph's ``JsonPlusSerializer`` already encodes channel values with
+msgpack; message histories are highly repetitive, so compressing the larger
+blobs cuts what every turn sends to and reads from Postgres. Compressed
+blobs carry their own type tag, so rows written before compression was
+enabled (or below the threshold) still load as plain msgpack.
+
+Counters cover the whole process (``serde_stats``); ``measure_turn()``
+additionally collects the bytes and time of a single turn.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional, Tuple
+
+import zstandard
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from app.core.config import settings
+
+COMPRESSED = "msgpack+zstd"
+
+
+class SerdeStats:
+    __slots__ = ("encoded", "decoded", "raw_bytes", "stored_bytes", "encode_seconds", "decode_seconds")
+
+    def __init__(self):
+        self.encoded = 0
+        self.decoded = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.encode_seconds = 0.0
+        self.decode_seconds = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "encoded": self.encoded,
+            "decoded": self.decoded,
+            "raw_bytes": self.raw_bytes,
+            "stored_bytes": self.stored_bytes,
+            "compression_ratio": round(self.raw_bytes / self.stored_bytes, 2) if self.stored_bytes else 1.0,
+            "encode_ms": round(self.encode_seconds * 1000, 2),
+            "decode_ms": round(self.decode_seconds * 1000, 2),
+        }
+
+    def __str__(self) -> str:
+        return " ".join(f"{k}={v}" for k, v in self.as_dict().items())
+
+
+serde_stats = SerdeStats()
+_turn_stats: ContextVar[Optional[SerdeStats]] = ContextVar("turn_serde_stats", default=None)
+
+
+@contextmanager
+def measure_turn() -> Iterator[SerdeStats]:
+    """Collect serializer work done in this context (and tasks it spawns)."""
+    stats = SerdeStats()
+    token = _turn_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _turn_stats.reset(token)
+
+
+class CompressingSerializer(JsonPlusSerializer):
+    def __init__(
+        self,
+        min_bytes: int = settings.CHECKPOINT_COMPRESS_MIN_BYTES,
+        level: int = settings.CHECKPOINT_ZSTD_LEVEL,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        # A negative threshold turns compression off
+        self.min_bytes = min_bytes
+        self.level = level
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        started = time.perf_counter()
+        type_, data = super().dumps_typed(obj)
+        raw = len(data)
+        if type_ == "msgpack" and 0 <= self.min_bytes <= raw:
+            compressed = zstandard.compress(data, self.level)
+            if len(compressed) < raw:
+                type_, data = COMPRESSED, compressed
+        self._record(raw, len(data), time.perf_counter() - started, encode=True)
+        return type_, data
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        started = time.perf_counter()
+        type_, payload = data
+        stored = len(payload)
+        if type_ == COMPRESSED:
+            payload = zstandard.decompress(payload)
+            type_ = "msgpack"
+        obj = super().loads_typed((type_, payload))
+        self._record(len(payload), stored, time.perf_counter() - started, encode=False)
+        return obj
+
+    @staticmethod
+    def _record(raw: int, stored: int, seconds: float, encode: bool):
+        for stats in (serde_stats, _turn_stats.get()):
+            if stats is None:
+                continue
+            stats.raw_bytes += raw
+            stats.stored_bytes += stored
+            if encode:
+                stats.encoded += 1
+                stats.encode_seconds += seconds
+            else:
+                stats.decoded += 1
+                stats.decode_seconds += seconds
+
+
+def create_serializer() -> CompressingSerializer:
+    # Plain msgpack still has to read blobs compressed while zstd was enabled
+    if settings.CHECKPOINT_SERDE == COMPRESSED:
+        return CompressingSerializer()
+    return CompressingSerializer(min_bytes=-1)
@@ -1,11 +1,144 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from langgraph.store.postgres.aio import AsyncPostgresStore
 
+from app.core.chatbot.chatbot_workflow import build_graph
+from app.core.chatbot.memory import memory_index_config
+from app.core.chatbot.memory_worker import memory_queue
+from app.core.broker import create_broker
+from app.core.config import settings
+from app.core.embeddings import embedding_service
+from app.core.lifecycle import lifecycle
+from app.core.llm import llm
+from app.core.ratelimit import create_guest_limiter, set_guest_limiter
+from app.core.recall_store import LocalRecallStore, create_recall_store, set_recall_store
+from app.core.sessions import thread_locks
+from app.core.websockets import manager
+from app.db.checkpoints import ArchivingPostgresSaver, CheckpointCompactor
+from app.db.connection import create_pool
+from app.db.serde import create_serializer
 from app.routers.restful import router as rest_router
 from app.routers.websockets import router as websocket_router
+from app.utils.tokens import get_encoding
+
+logger = logging.getLogger("chatbot")
+
+
+def check_backends():
+    """Refuse settings that need the Postgres pool when there is none."""
+    if settings.STORAGE_BACKEND != "memory":
+        return
+    needs_pool = []
+    if settings.COORDINATION_BACKEND == "postgres":
+        needs_pool.append("COORDINATION_BACKEND=postgres")
+    if settings.RECALL_BACKEND == "pgvector":
+        needs_pool.append("RECALL_BACKEND=pgvector")
+    if needs_pool:
+        raise RuntimeError(
+            f"{', '.join(needs_pool)} needs a database, but STORAGE_BACKEND=memory "
+            "opens no connection pool"
+        )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    check_backends()
+    # One pool, store, checkpointer and compiled graph for the whole process;
+    # sessions borrow connections from the pool instead of opening their own.
+    # Warm-up runs in parallel: connections open while the LLM client and the
+    # tokenizer are built on worker threads.
+    if settings.STORAGE_BACKEND == "memory":
+        # No database: state lives and dies with the process (local runs,
+        # load tests). The store has no vector index, so memory search
+        # falls back to listing the user's namespace.
+        from langgraph.checkpoint.memory import InMemorySaver
+        from langgraph.store.memory import InMemoryStore
+
+        pool = None
+        compactor = None
+        await asyncio.gather(
+            asyncio.to_thread(llm.get_model), asyncio.to_thread(get_encoding)
+        )
+        store = InMemoryStore()
+        checkpointer = InMemorySaver(serde=create_serializer())
+    else:
+        pool = create_pool()
+        await asyncio.gather(
+            pool.open(wait=True),
+            asyncio.to_thread(llm.get_model),
+            asyncio.to_thread(get_encoding),
+        )
+        logger.info(f"Postgres pool ready: {pool.get_stats()}")
+
+        store = AsyncPostgresStore(pool, index=memory_index_config())
+        compactor = CheckpointCompactor(pool)
+        # Creates the store tables and the vector index on first start;
+        # memory search fails on every turn without them
+        await store.setup()
+        await compactor.setup()
+        checkpointer = ArchivingPostgresSaver(pool, compactor, serde=create_serializer())
+
+    # Thread locks also serialize across processes when there is a database
+    thread_locks.use_pool(pool)
+    app.state.pool = pool
+    app.state.compactor = compactor
+    app.state.graph = build_graph(checkpointer=checkpointer, store=store)
+    memory_queue.start(app.state.graph)
+    warmup = None
+    if settings.EMBEDDING_WARMUP:
+        # Loads the model in the background; early requests just wait for it,
+        # and /ready reports ready once it is done
+        warmup = asyncio.create_task(embedding_service.warm_up())
+
+    recall_store = create_recall_store(pool)
+    await recall_store.setup()
+    set_recall_store(recall_store)
+    snapshots = None
+    if isinstance(recall_store, LocalRecallStore):
+        snapshots = asyncio.create_task(
+            recall_store.run_snapshots(settings.RECALL_SNAPSHOT_INTERVAL)
+        )
+
+    guest_limiter = create_guest_limiter(pool)
+    await guest_limiter.setup()
+    set_guest_limiter(guest_limiter)
+    # Expired guest counters are dropped a few times per window
+    pruning = asyncio.create_task(guest_limiter.run_pruning(settings.GUEST_CHAT_WINDOW / 24))
+    await manager.start(create_broker(pool))
+    retention = None
+    if compactor and settings.CHECKPOINT_COMPACTION_INTERVAL > 0:
+        retention = asyncio.create_task(
+            compactor.run(settings.CHECKPOINT_COMPACTION_INTERVAL)
+        )
+    if warmup:
+        warmup.add_done_callback(lambda _: setattr(lifecycle, "ready", not lifecycle.draining))
+    else:
+        lifecycle.ready = True
+    try:
+        yield
+    finally:
+        lifecycle.ready = False
+        if retention:
+            retention.cancel()
+        pruning.cancel()
+        await manager.stop()
+        if snapshots:
+            snapshots.cancel()
+        if warmup:
+            warmup.cancel()
+        await recall_store.aclose()
+        # Pending memory extractions get the same grace period as turns
+        await memory_queue.stop(timeout=settings.SERVER_DRAIN_TIMEOUT)
+        await llm.aclose()
+        if pool:
+            await pool.close()
 
 
-app = FastAPI(title="Mental Engine Chatbot")
+app = FastAPI(title="Mental Engine Chatbot", lifespan=lifespan)
 
 
 app.add_middleware(
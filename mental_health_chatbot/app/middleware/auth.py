@@ -1,22 +1,147 @@
-from fastapi import WebSocket, status
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request, WebSocket, status
 from jose import jwt, JWTError
+from starlette.requests import HTTPConnection
 from app.core.config import settings
 from datetime import datetime
 
 
-async def get_current_user_id(websocket: WebSocket) -> str:
-    token = websocket.cookies.get("access_token")
-    if token and token.startswith("Bearer "):
-        token = token.replace("Bearer ", "")
-    if token:
+def parse_keys(spec: str) -> Dict[str, str]:
+    """``"kid=secret,kid2=secret2"`` -> ``{"kid": "secret", ...}``."""
+    keys = {}
+    for entry in filter(None, (e.strip() for e in spec.split(","))):
+        kid, _, secret = entry.partition("=")
+        keys[kid] = secret
+    return keys
+
+
+class TokenVerifier:
+    """Verifies JWTs and caches the claims of valid ones until they expire.
+
+    Cache keys are SHA-256 digests, so raw tokens are never kept in memory.
+    For key rotation, tokens signed with any key in ``SECRET_KEYS`` verify
+    too: a ``kid`` header selects the key directly, otherwise the current key
+    is tried first and then the others.
+    """
+
+    def __init__(
+        self,
+        secret_key: str = settings.SECRET_KEY,
+        extra_keys: Optional[Dict[str, str]] = None,
+        algorithm: str = settings.ALGORITHM,
+        max_entries: int = settings.AUTH_CACHE_SIZE,
+        ttl: float = settings.AUTH_CACHE_TTL,
+    ):
+        self.secret_key = secret_key
+        self.keys = extra_keys if extra_keys is not None else parse_keys(settings.SECRET_KEYS)
+        self.algorithm = algorithm
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # sha256(token) -> (claims, cached until)
+        self._cache: "OrderedDict[bytes, Tuple[dict, float]]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._rejected = 0
+
+    def _candidate_keys(self, token: str):
+        kid = jwt.get_unverified_header(token).get("kid")
+        if kid in self.keys:
+            return [self.keys[kid]]
+        return [self.secret_key, *self.keys.values()]
+
+    def _decode(self, token: str) -> dict:
+        error = None
+        for key in self._candidate_keys(token):
+            try:
+                return jwt.decode(token, key, algorithms=[self.algorithm])
+            except JWTError as e:
+                error = e
+        raise error
+
+    def verify(self, token: str) -> dict:
+        """Claims of ``token``; raises ``JWTError`` when it is invalid or expired."""
+        digest = hashlib.sha256(token.encode()).digest()
+        now = time.time()
+        cached = self._cache.get(digest)
+        if cached is not None and cached[1] > now:
+            self._cache.move_to_end(digest)
+            self._hits += 1
+            return cached[0]
+
+        self._misses += 1
         try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-            return payload.get("sub")
+            claims = self._decode(token)
         except JWTError:
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-            return None
-    # Allow guest user
-    client_ip = websocket.client.host if websocket.client else "unknown"
+            self._cache.pop(digest, None)
+            self._rejected += 1
+            raise
+        # Cached until the token expires, never longer than ttl
+        until = now + self.ttl
+        if isinstance(claims.get("exp"), (int, float)):
+            until = min(until, claims["exp"])
+        self._cache[digest] = (claims, until)
+        self._cache.move_to_end(digest)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return claims
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._misses
+        return {
+            "cached": len(self._cache),
+            "hits": self._hits,
+            "misses": self._misses,
+            "rejected": self._rejected,
+            "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+token_verifier = TokenVerifier()
+
+
+def read_token(connection: HTTPConnection) -> Optional[str]:
+    # Browsers send the cookie; integrations use the Authorization header
+    token = connection.headers.get("authorization") or connection.cookies.get("access_token")
+    if token and token.startswith("Bearer "):
+        token = token.replace("Bearer ", "")
+    return token
+
+
+def guest_user_id(connection: HTTPConnection) -> str:
+    client_ip = connection.client.host if connection.client else "unknown"
     safe_ip = client_ip.replace(".", "_")
     today = datetime.now().strftime("%Y%m%d")
     return f"guest-{safe_ip}-{today}"
+
+
+def authenticate(connection: HTTPConnection) -> Optional[str]:
+    """User id of the connection: the token's subject, a guest id when there
+    is no token, None when the token is invalid."""
+    token = read_token(connection)
+    if not token:
+        return guest_user_id(connection)
+    try:
+        return token_verifier.verify(token).get("sub")
+    except JWTError:
+        return None
+
+
+async def get_current_user_id(websocket: WebSocket) -> Optional[str]:
+    """User id for a socket, or None; the caller rejects the handshake then."""
+    return authenticate(websocket)
+
+
+async def get_request_user_id(request: Request) -> str:
+    """REST counterpart of ``get_current_user_id``: a bad token is a 401."""
+    user_id = authenticate(request)
+    if user_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user_id
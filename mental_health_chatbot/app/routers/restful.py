@@ -1,26 +1,221 @@
 import asyncio
+import logging
+from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
+from langgraph.graph.state import CompiledStateGraph
+from psycopg_pool import AsyncConnectionPool
 
 from app.core.chatbot.chatbot_workflow import main
-from app.core.chatbot.models import ChatResponse, MessageRequest
+from app.core.chatbot.memory_cache import memory_cache
+from app.core.chatbot.memory_worker import memory_queue
+from app.core.chatbot.prompts import prompt_assembler
+from app.core.chatbot.response_cache import response_cache
+from app.core.chatbot.models import (
+    BatchItem,
+    BatchRequest,
+    BatchResponse,
+    ChatResponse,
+    MessageRequest,
+)
+from app.core.config import settings
+from app.core.dependencies import accepting_turns, get_compactor, get_graph, get_pool
+from app.core.embeddings import embedding_service
+from app.core.encoding import dumps
+from app.core.lifecycle import lifecycle
+from app.core.llm import llm
+from app.core.metrics import registry, trace_turn
+from app.core.ratelimit import get_guest_limiter, guest_limit_key
+from app.core.sessions import generate_thread_id, owns_thread, thread_locks
+from app.core.streaming import TurnStream
+from app.core.websockets import manager
+from app.db.checkpoints import CheckpointCompactor
+from app.db.serde import serde_stats
+from app.middleware.auth import get_request_user_id, token_verifier
 
-router = APIRouter()
-config = {
-    "configurable": {
-        "thread_id": "90",
-        "user_id": "80",
-    }
-}
+logger = logging.getLogger("chatbot")
+router = APIRouter(default_response_class=ORJSONResponse)
+
+
+def turn_config(user_id: str, thread_id: str, stream: bool = False) -> dict:
+    return {"configurable": {"user_id": user_id, "thread_id": thread_id, "stream": stream}}
+
+
+def resolve_thread(user_id: str, thread_id: Optional[str]) -> str:
+    """The caller's thread, or a new one; someone else's thread is a 404."""
+    if not thread_id:
+        return generate_thread_id(user_id)
+    if not owns_thread(user_id, thread_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Thread not found")
+    return thread_id
+
+
+async def check_guest_limit(user_id: str, turns: int = 1):
+    if not user_id.startswith("guest-"):
+        return
+    limiter = get_guest_limiter()
+    for _ in range(turns):
+        if not await limiter.hit(guest_limit_key(user_id)):
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Guest users are limited to {settings.GUEST_CHAT_LIMIT} chats per day. Please sign in for unlimited access.",
+            )
 
 
 @router.get("/health", response_model=dict)
-async def health_check():
+async def health_check(pool: Optional[AsyncConnectionPool] = Depends(get_pool)):
+    """Liveness of this worker and its database connection."""
+    if pool is not None:
+        try:
+            async with pool.connection(timeout=2) as conn:
+                await conn.execute("SELECT 1")
+        except Exception as e:
+            return ORJSONResponse(
+                {"status": "unhealthy", "database": str(e) or type(e).__name__},
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
     return {"status": "all good here"}
 
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat(request: MessageRequest):
-    task = await main(config, request)  # Start the conversation
-    await task
-    return task
+@router.get("/ready", response_model=dict)
+async def ready():
+    """Whether this worker should receive traffic.
+
+    It must be warmed up, not draining, and receiving other workers' broadcasts.
+    """
+    if not lifecycle.ready:
+        return ORJSONResponse(
+            {"status": "draining" if lifecycle.draining else "starting"},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+    if manager.broker.error:
+        return ORJSONResponse(
+            {"status": "broker_disconnected", "broker": manager.broker.error},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+    return {"status": "ready", "in_flight_turns": lifecycle.in_flight}
+
+
+@router.get("/stats", response_model=dict)
+async def stats(
+    pool: AsyncConnectionPool = Depends(get_pool),
+    compactor: CheckpointCompactor = Depends(get_compactor),
+):
+    return {
+        "db_pool": pool.get_stats() if pool else None,
+        "memory_queue": memory_queue.stats(),
+        "memory_cache": memory_cache.stats(),
+        "embeddings": embedding_service.stats(),
+        "llm": llm.stats(),
+        "response_cache": response_cache.stats(),
+        "prompts": prompt_assembler.stats(),
+        "connections": manager.stats(),
+        "checkpoints": compactor.stats() if compactor else None,
+        "checkpoint_serde": serde_stats.as_dict(),
+        "auth": token_verifier.stats(),
+    }
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@router.post("/chat", response_model=ChatResponse, dependencies=[Depends(accepting_turns)])
+async def chat(
+    request: MessageRequest,
+    graph: CompiledStateGraph = Depends(get_graph),
+    user_id: str = Depends(get_request_user_id),
+):
+    thread_id = resolve_thread(user_id, request.thread_id)
+    await check_guest_limit(user_id)
+    config = turn_config(user_id, thread_id)
+    response = await main(graph, config, request)
+    memory_queue.submit(config)
+    return ChatResponse(response=response, thread_id=config["configurable"]["thread_id"])
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {dumps(data).decode()}\n\n"
+
+
+@router.post("/chat/stream", dependencies=[Depends(accepting_turns)])
+async def chat_stream(
+    request: MessageRequest,
+    graph: CompiledStateGraph = Depends(get_graph),
+    user_id: str = Depends(get_request_user_id),
+):
+    """Server-sent events: ``delta`` events as tokens arrive, then ``done``."""
+    thread_id = resolve_thread(user_id, request.thread_id)
+    await check_guest_limit(user_id)
+    config = turn_config(user_id, thread_id, stream=True)
+
+    async def run(deltas: asyncio.Queue) -> TurnStream:
+        async with lifecycle.turn(), thread_locks.hold(thread_id):
+            with trace_turn("sse", user_id, thread_id):
+                turn = TurnStream(graph, request.message, config)
+                async for delta in turn:
+                    deltas.put_nowait(delta)
+        return turn
+
+    async def events():
+        # The turn runs in a task of its own: a generator abandoned by a
+        # disconnecting client is finalized in another context, where the
+        # turn trace could not be closed
+        deltas: asyncio.Queue = asyncio.Queue()
+        task = asyncio.create_task(run(deltas))
+        task.add_done_callback(lambda _: deltas.put_nowait(None))
+        try:
+            while (delta := await deltas.get()) is not None:
+                yield sse("delta", {"content": delta})
+            turn = task.result()
+            yield sse(
+                "done",
+                {"response": turn.response, "thread_id": thread_id, "usage": turn.usage},
+            )
+        except Exception as e:
+            logger.exception("Chatbot error")
+            yield sse("error", {"message": str(e)})
+            return
+        finally:
+            task.cancel()
+        memory_queue.submit(config)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/chat/batch", response_model=BatchResponse, dependencies=[Depends(accepting_turns)])
+async def chat_batch(
+    request: BatchRequest,
+    graph: CompiledStateGraph = Depends(get_graph),
+    user_id: str = Depends(get_request_user_id),
+):
+    """Run independent messages concurrently, at most REST_BATCH_CONCURRENCY at once.
+
+    Messages naming the same thread still run one after another, in order
+    of arrival at the thread lock. One failing message does not fail the batch.
+    """
+    # Check every thread before any turn runs or counts against the limit
+    thread_ids = [resolve_thread(user_id, m.thread_id) for m in request.messages]
+    await check_guest_limit(user_id, len(request.messages))
+    semaphore = asyncio.Semaphore(settings.REST_BATCH_CONCURRENCY)
+
+    async def run(item: MessageRequest, thread_id: str) -> BatchItem:
+        config = turn_config(user_id, thread_id)
+        async with semaphore:
+            try:
+                response = await main(graph, config, item)
+            except Exception as e:
+                logger.exception("Chatbot error")
+                return BatchItem(thread_id=thread_id, error=str(e))
+        memory_queue.submit(config)
+        return BatchItem(thread_id=thread_id, response=response)
+
+    return BatchResponse(results=await asyncio.gather(*(run(m, t) for m, t in zip(request.messages, thread_ids))))
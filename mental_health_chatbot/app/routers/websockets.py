@@ -1,5 +1,7 @@
-from fastapi import APIRouter, WebSocket
+from fastapi import APIRouter, Depends, WebSocket
+from langgraph.graph.state import CompiledStateGraph
 
+from app.core.dependencies import get_graph
 from app.core.websockets import websocket_endpoint
 
 router = APIRouter()
@@ -7,5 +9,7 @@ router = APIRouter()
 
 # Add WebSocket route
 @router.websocket("/ws/chat")
-async def websocket_chat(websocket: WebSocket):
-    await websocket_endpoint(websocket)
+async def websocket_chat(
+    websocket: WebSocket, graph: CompiledStateGraph = Depends(get_graph)
+):
+    await websocket_endpoint(websocket, graph)
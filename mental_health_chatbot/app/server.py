@@ -0,0 +1,110 @@
+"""Production entry point: several uvicorn workers with graceful drain.
+
+    python -m app.server
+
+Runs ``SERVER_WORKERS`` processes (default: one per CPU core this process
+may use) on uvloop and httptools. Workers share nothing but the listening
+socket: each has its own DB pool, graph and caches, so ``DB_POOL_MAX_SIZE``
+applies per worker. Several workers need every backend to be shared:
+``STORAGE_BACKEND=postgres``, ``COORDINATION_BACKEND=postgres`` and
+``RECALL_BACKEND=pgvector``. With any of them process-local the default is
+a single worker, and asking for more refuses to start.
+
+WebSocket compression (permessage-deflate) is agreed per connection in the
+handshake, so ``WS_PER_MESSAGE_DEFLATE`` only controls whether it is
+offered; a client that accepts gets every frame compressed.
+
+On SIGTERM a worker stops accepting connections and turns (``/ready``
+returns 503), lets in-flight turns finish for up to ``SERVER_DRAIN_TIMEOUT``
+seconds, closes the remaining sockets with 1012 (service restart) so clients
+reconnect elsewhere, and then runs the normal shutdown, which flushes the
+memory extraction queue.
+"""
+
+import logging
+import os
+import sys
+from typing import List
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from app.core.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class DrainingServer(uvicorn.Server):
+    async def shutdown(self, sockets=None):
+        # Imported here: the supervisor process never loads the app
+        from app.core.lifecycle import lifecycle
+        from app.core.websockets import manager
+
+        logger.info(f"Draining {lifecycle.in_flight} in-flight turns")
+        if not await lifecycle.drain(settings.SERVER_DRAIN_TIMEOUT):
+            logger.warning(f"Drain timed out with {lifecycle.in_flight} turns still running")
+        await manager.close_all()
+        await super().shutdown(sockets)
+
+
+def local_backends() -> List[str]:
+    """Backends whose state lives in one process and would split across workers."""
+    backends = []
+    if settings.STORAGE_BACKEND == "memory":
+        backends.append("STORAGE_BACKEND=memory")
+    if settings.COORDINATION_BACKEND == "memory":
+        backends.append("COORDINATION_BACKEND=memory")
+    if settings.RECALL_BACKEND == "local":
+        # Each worker would hold part of the recall data and overwrite the
+        # others' snapshot files
+        backends.append("RECALL_BACKEND=local")
+    return backends
+
+
+def worker_count() -> int:
+    local = local_backends()
+    if settings.SERVER_WORKERS > 1 and local:
+        logger.error(
+            f"SERVER_WORKERS={settings.SERVER_WORKERS} needs shared backends; "
+            f"process-local: {', '.join(local)}"
+        )
+        sys.exit(1)
+    if settings.SERVER_WORKERS:
+        return settings.SERVER_WORKERS
+    if local:
+        logger.info(f"Running a single worker; process-local: {', '.join(local)}")
+        return 1
+    # Honours CPU affinity and cpusets, unlike os.cpu_count(); Linux only
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+def main():
+    workers = worker_count()
+    config = uvicorn.Config(
+        "app.main:app",
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        ws="websockets",
+        ws_per_message_deflate=settings.WS_PER_MESSAGE_DEFLATE,
+        ws_ping_interval=settings.WS_PING_INTERVAL,
+        ws_ping_timeout=settings.WS_PING_TIMEOUT,
+        proxy_headers=True,
+        backlog=settings.SERVER_BACKLOG,
+        timeout_graceful_shutdown=settings.SERVER_DRAIN_TIMEOUT,
+    )
+    server = DrainingServer(config)
+    if workers > 1:
+        Multiprocess(config, target=server.run, sockets=[config.bind_socket()]).run()
+    else:
+        server.run()
+        if not server.started:
+            sys.exit(3)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,29 @@
-import os
+from typing import Optional
 
-from dotenv import load_dotenv
-from langchain.chat_models import init_chat_model
+import httpx
 
-# Load environment variables from .env file
-load_dotenv()
+from app.core.config import settings
 
-# Retrieve the API key from the environment
-grok_api_key = os.getenv("GROQ_API_KEY")
 
-if grok_api_key is None:
-    raise ValueError("GROQ_API_KEY is not set in the environment variables.")
+# Initialize the chat model with the API key
+def chat_model(
+    model_name: Optional[str] = None,
+    http_async_client: Optional[httpx.AsyncClient] = None,
+    max_retries: int = 2,
+):
+    """Build a chat model; use ``app.core.llm.llm`` for the shared, pooled instances."""
+    if settings.GROQ_API_KEY is None:
+        raise ValueError("GROQ_API_KEY is not set in the environment variables.")
 
+    # Imported here: the LangChain provider machinery is the slowest part of
+    # importing the app and is only needed once a model is actually built.
+    from langchain.chat_models import init_chat_model
 
-# Initialize the chat model with the API key
-def chat_model():
     model = init_chat_model(
-        "meta-llama/llama-4-scout-17b-16e-instruct",
+        model_name or settings.LLM_MODEL,
         model_provider="groq",
-        api_key=grok_api_key,
+        api_key=settings.GROQ_API_KEY,
+        http_async_client=http_async_client,
+        max_retries=max_retries,
     )  # /llama3-8b-8192
     return model
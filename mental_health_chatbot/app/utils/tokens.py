@@ -0,0 +1,39 @@
+import logging
+from functools import lru_cache
+from typing import List, Optional
+
+import tiktoken
+from langchain_core.messages import AnyMessage
+
+logger = logging.getLogger(__name__)
+
+# Per-message overhead for role/formatting tokens, as in OpenAI's cookbook
+MESSAGE_OVERHEAD = 4
+# Rough characters-per-token ratio used when no encoding is available
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=1)
+def get_encoding() -> Optional[tiktoken.Encoding]:
+    # Not the Llama tokenizer, but close enough to keep a budget. tiktoken
+    # downloads the BPE file on first use, so offline hosts fall back to an
+    # estimate instead of failing the turn.
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        logger.warning("tiktoken encoding unavailable, estimating token counts")
+        return None
+
+
+def count_text_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text))
+
+
+def count_tokens(messages: List[AnyMessage]) -> int:
+    return sum(
+        count_text_tokens(str(message.content)) + MESSAGE_OVERHEAD
+        for message in messages
+    )
@@ -0,0 +1,68 @@
+"""Import-time budget check for the application entry point.
+
+Runs ``python -X importtime -c "import app.main"`` in a fresh interpreter and
+fails (exit status 1) when the cumulative import time of ``app.main`` exceeds
+the budget, printing the slowest imports so the regression is easy to find.
+Heavy objects (LLM client, embedding model, DB pool) must be built in the
+FastAPI lifespan, never at import.
+
+    python -m benchmarks.import_time --budget-ms 2000
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def measure(module: str):
+    """Return [(cumulative_us, self_us, name)] for every import made by ``module``."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"import {module} failed")
+
+    timings = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            timings.append((int(match.group(2)), int(match.group(1)), match.group(4)))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=float(os.getenv("IMPORT_TIME_BUDGET_MS", 2000)),
+    )
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    timings = measure(args.module)
+    total = next(cum for cum, _, name in timings if name == args.module) / 1000
+
+    print(f"import {args.module}: {total:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    print("slowest imports by self time:")
+    for cumulative, own, name in sorted(timings, key=lambda t: t[1], reverse=True)[
+        : args.top
+    ]:
+        print(f"  {own / 1000:8.1f} ms self {cumulative / 1000:8.1f} ms total  {name}")
+
+    if total > args.budget_ms:
+        print("FAIL: import time over budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""Load test for the chat WebSocket against a fake model and in-memory storage.
+
+Starts the app in a child process with ``STORAGE_BACKEND=memory`` and a
+deterministic fake chat model (fixed time to first token and token rate),
+opens many concurrent authenticated WebSocket sessions, holds them all open,
+then has each run a few streamed turns. Everything except the model and the
+database runs as it does in production: auth, connection manager, limits,
+the graph, checkpoint serialization, background memory extraction.
+
+Reports turn latency and time to first token (p50/p95/p99), turns/sec and
+server memory per open connection (Linux only).
+
+    python -m benchmarks.load_test --sessions 2000 --turns 3 --json report.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REPLY = (
+    "It sounds like you have been carrying a lot lately. It is okay to feel "
+    "tired when so much is asking for your attention. What has felt hardest "
+    "this week, and is there one small thing that would make tomorrow lighter?"
+)
+
+
+def make_fake_model(latency: float, tokens_per_second: float):
+    """Chat model answering ``REPLY`` word by word at a fixed pace."""
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.messages import AIMessage, AIMessageChunk
+    from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+    words = [w + " " for w in REPLY.split()]
+    usage = {"input_tokens": 0, "output_tokens": len(words), "total_tokens": len(words)}
+
+    class FakeChatModel(BaseChatModel):
+        @property
+        def _llm_type(self) -> str:
+            return "fake-benchmark"
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+            return ChatResult(
+                generations=[ChatGeneration(message=AIMessage(content=REPLY, usage_metadata=usage))]
+            )
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+            await asyncio.sleep(latency + len(words) / tokens_per_second)
+            return self._generate(messages)
+
+        async def _astream(
+            self, messages, stop=None, run_manager=None, **kwargs
+        ) -> AsyncIterator[ChatGenerationChunk]:
+            await asyncio.sleep(latency)
+            for word in words:
+                await asyncio.sleep(1 / tokens_per_second)
+                yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=usage))
+
+    return FakeChatModel()
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def standalone_env():
+    """Settings the app requires at import, so the benchmark runs without a real deployment.
+
+    Nothing connects to the database or the provider: storage is in memory
+    and the model is fake. Must run before anything from ``app`` is imported.
+    """
+    os.environ["STORAGE_BACKEND"] = "memory"
+    os.environ.setdefault("GROQ_API_KEY", "load-test")
+    os.environ.setdefault("DATABASE_URL", "postgresql://load-test@localhost/unused")
+    os.environ.setdefault("EMBEDDING_WARMUP", "false")
+
+
+def serve(args):
+    """Child process: the real app with the fake model and in-memory storage."""
+    standalone_env()
+    os.environ.setdefault("WS_MAX_CONNECTIONS", str(max(10000, args.sessions * 2)))
+    if args.llm_concurrency:
+        os.environ["LLM_MAX_CONCURRENCY"] = str(args.llm_concurrency)
+    raise_fd_limit()
+    sys.path.insert(0, ROOT)
+
+    import uvicorn
+
+    from app.core.llm import llm
+    from app.main import app
+
+    llm.set_model(make_fake_model(args.latency, args.tokens_per_second))
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning", backlog=4096)
+
+
+def rss_bytes(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    ordered = sorted(values)
+
+    def at(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+    return {"p50": at(0.50), "p95": at(0.95), "p99": at(0.99)}
+
+
+class Results:
+    def __init__(self):
+        self.connected = 0
+        self.connect_failures = 0
+        self.turn_errors = 0
+        self.latencies: List[float] = []
+        self.ttfts: List[float] = []
+
+
+async def wait_ready(port: int, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+async def run_turn(ws, text: str, results: Results):
+    started = time.perf_counter()
+    first = None
+    await ws.send(text)
+    while True:
+        frame = json.loads(await ws.recv())
+        kind = frame.get("type")
+        if kind == "ping":
+            await ws.send(json.dumps({"type": "pong"}))
+        elif kind == "delta" and first is None:
+            first = time.perf_counter() - started
+        elif kind == "done":
+            results.latencies.append(time.perf_counter() - started)
+            if first is not None:
+                results.ttfts.append(first)
+            return
+        elif kind in ("error", "fatal_error"):
+            results.turn_errors += 1
+            return
+
+
+async def session(
+    index: int,
+    args,
+    token: str,
+    connect_gate: asyncio.Semaphore,
+    all_connected: asyncio.Event,
+    results: Results,
+):
+    import websockets
+
+    url = f"ws://127.0.0.1:{args.port}/ws/chat?stream=true"
+    rng = random.Random(index)
+    try:
+        async with connect_gate:
+            ws = await websockets.connect(
+                url, additional_headers={"Authorization": f"Bearer {token}"}, open_timeout=60
+            )
+    except Exception:
+        results.connect_failures += 1
+        return
+    results.connected += 1
+    try:
+        async with ws:
+            await all_connected.wait()
+            for turn in range(args.turns):
+                await asyncio.sleep(rng.uniform(0, args.think_time))
+                try:
+                    await run_turn(ws, f"message {turn} from session {index}", results)
+                except Exception:
+                    results.turn_errors += 1
+                    return
+    except Exception:
+        pass
+
+
+async def drive(args, server: subprocess.Popen) -> Dict[str, Any]:
+    from jose import jwt
+
+    standalone_env()
+    sys.path.insert(0, ROOT)
+    from app.core.config import settings
+
+    await wait_ready(args.port)
+    base_rss = rss_bytes(server.pid)
+
+    results = Results()
+    connect_gate = asyncio.Semaphore(args.connect_concurrency)
+    all_connected = asyncio.Event()
+    tokens = [
+        jwt.encode({"sub": f"load-user-{i}"}, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+        for i in range(args.sessions)
+    ]
+    tasks = [
+        asyncio.create_task(session(i, args, tokens[i], connect_gate, all_connected, results))
+        for i in range(args.sessions)
+    ]
+
+    while results.connected + results.connect_failures < args.sessions:
+        await asyncio.sleep(0.1)
+    connected_rss = rss_bytes(server.pid)
+
+    started = time.perf_counter()
+    all_connected.set()
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - started
+    peak_rss = rss_bytes(server.pid)
+
+    per_connection = None
+    if base_rss is not None and connected_rss is not None and results.connected:
+        per_connection = round((connected_rss - base_rss) / results.connected / 1024, 1)
+    return {
+        "sessions": args.sessions,
+        "connected": results.connected,
+        "connect_failures": results.connect_failures,
+        "turns": len(results.latencies),
+        "turn_errors": results.turn_errors,
+        "wall_seconds": round(wall, 2),
+        "turns_per_second": round(len(results.latencies) / wall, 1) if wall else None,
+        "turn_latency_ms": percentiles(results.latencies),
+        "ttft_ms": percentiles(results.ttfts),
+        "server_rss_mb": {
+            "idle": base_rss and round(base_rss / 2**20, 1),
+            "connected": connected_rss and round(connected_rss / 2**20, 1),
+            "after": peak_rss and round(peak_rss / 2**20, 1),
+        },
+        "memory_per_connection_kb": per_connection,
+        "fake_model": {"latency": args.latency, "tokens_per_second": args.tokens_per_second},
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--turns", type=int, default=3, help="turns per session")
+    parser.add_argument("--think-time", type=float, default=1.0, help="max pause before each turn (s)")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake model time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    parser.add_argument("--llm-concurrency", type=int, help="override LLM_MAX_CONCURRENCY")
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    args.port = args.port or free_port()
+    raise_fd_limit()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.load_test", "--serve", *sys.argv[1:], "--port", str(args.port)],
+        cwd=ROOT,
+    )
+    try:
+        report = asyncio.run(drive(args, server))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
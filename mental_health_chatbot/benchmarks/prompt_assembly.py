@@ -0,0 +1,80 @@
+"""Micro-benchmark of per-turn prompt assembly in ``call_model``.
+
+Compares the previous approach (format the system prompt with the memories,
+build a ``ChatPromptTemplate`` from it and invoke it) with
+``PromptAssembler`` on a realistic turn: a few stored memories, a running
+summary and a conversation history.
+
+    python -m benchmarks.prompt_assembly --history 20 --memories 3
+"""
+
+import argparse
+import json
+import time
+import timeit
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langgraph.store.base import Item
+
+from app.core.chatbot.memory import format_memories
+from app.core.chatbot.prompts import PromptAssembler
+from app.utils.sys_prompt import SYSTEM_PROMPT
+
+
+def legacy_assemble(memories, messages, summary):
+    info = format_memories(memories).replace("{", "{{").replace("}", "}}")
+    system_msg = SYSTEM_PROMPT.format(info=info)
+    if summary:
+        messages = [SystemMessage(content=f"Summary of the earlier conversation: {summary}")] + messages
+    template = ChatPromptTemplate.from_messages(
+        [("system", system_msg), MessagesPlaceholder(variable_name="messages")]
+    )
+    return template.invoke({"messages": messages})
+
+
+def fixtures(history: int, memories: int):
+    items = [
+        Item(
+            value={"data": json.dumps({"Preference": f"likes walks {i}", "Mood": "tired"})},
+            key=f"thread-{i}",
+            namespace=("memories", "user-1"),
+            created_at=time.time(),
+            updated_at=time.time(),
+        )
+        for i in range(memories)
+    ]
+    messages = []
+    for i in range(history):
+        messages.append(HumanMessage(content=f"I have had a long week at work, day {i}."))
+        messages.append(AIMessage(content="That sounds exhausting. What weighed on you most?"))
+    return items, messages, "The user has been stressed by deadlines and sleeps badly."
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--history", type=int, default=20, help="turns of history")
+    parser.add_argument("--memories", type=int, default=3)
+    parser.add_argument("--number", type=int, default=2000, help="assemblies per measurement")
+    args = parser.parse_args()
+
+    memories, messages, summary = fixtures(args.history, args.memories)
+    assembler = PromptAssembler()
+
+    def cold():
+        # A new memory version every call: nothing is served from the cache
+        assembler._memory_messages.clear()
+        assembler.assemble("user-1", memories, messages, summary)
+
+    cases = {
+        "legacy template": lambda: legacy_assemble(memories, messages, summary),
+        "assembler, cache miss": cold,
+        "assembler, cache hit": lambda: assembler.assemble("user-1", memories, messages, summary),
+    }
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=args.number, repeat=5)) / args.number
+        print(f"{name:24s} {best * 1e6:9.1f} us/turn")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+
+# Settings are read at import; nothing in the unit tests connects to either
+os.environ.setdefault("DATABASE_URL", "postgresql://test@localhost/unused")
+os.environ.setdefault("GROQ_API_KEY", "test")
@@ -0,0 +1,70 @@
+import time
+
+import pytest
+from jose import JWTError, jwt
+
+from app.middleware import auth
+from app.middleware.auth import TokenVerifier, parse_keys
+
+
+def token(secret: str, kid=None, **claims) -> str:
+    claims.setdefault("sub", "alice")
+    claims.setdefault("exp", int(time.time()) + 600)
+    headers = {"kid": kid} if kid else None
+    return jwt.encode(claims, secret, algorithm="HS256", headers=headers)
+
+
+def verifier(**kwargs) -> TokenVerifier:
+    kwargs.setdefault("extra_keys", parse_keys("old=previous-secret"))
+    return TokenVerifier(secret_key="current-secret", algorithm="HS256", **kwargs)
+
+
+def test_parse_keys():
+    assert parse_keys(" a=1, b=x=y ,") == {"a": "1", "b": "x=y"}
+    assert parse_keys("") == {}
+
+
+def test_rotated_keys_still_verify():
+    tokens = verifier()
+    assert tokens.verify(token("current-secret"))["sub"] == "alice"
+    # Selected by kid, or found by trying every key when there is none
+    assert tokens.verify(token("previous-secret", kid="old"))["sub"] == "alice"
+    assert tokens.verify(token("previous-secret"))["sub"] == "alice"
+
+
+def test_unknown_key_is_rejected():
+    tokens = verifier()
+    with pytest.raises(JWTError):
+        tokens.verify(token("someone-elses-secret"))
+    # A kid pins the key: a token claiming "old" must be signed with it
+    with pytest.raises(JWTError):
+        tokens.verify(token("current-secret", kid="old"))
+    assert tokens.stats()["rejected"] == 2
+    assert tokens.stats()["cached"] == 0
+
+
+def test_expired_token_is_rejected():
+    with pytest.raises(JWTError):
+        verifier().verify(token("current-secret", exp=int(time.time()) - 10))
+
+
+def test_claims_are_cached_until_exp_and_no_longer(monkeypatch):
+    tokens = verifier(ttl=3600)
+    exp = int(time.time()) + 60
+    raw = token("current-secret", exp=exp)
+    tokens.verify(raw)
+    tokens.verify(raw)
+    assert tokens.stats()["hits"] == 1
+
+    # Past exp the cached claims are not served; the token is decoded again
+    now = time.time()
+    monkeypatch.setattr(auth.time, "time", lambda: now + 61)
+    tokens.verify(raw)
+    assert tokens.stats()["misses"] == 2
+
+
+def test_cache_is_bounded():
+    tokens = verifier(max_entries=2)
+    for user in ("a", "b", "c"):
+        tokens.verify(token("current-secret", sub=user))
+    assert tokens.stats()["cached"] == 2
@@ -0,0 +1,26 @@
+import asyncio
+import json
+
+from app.core.broker import PostgresBroker
+
+
+def test_malformed_notifications_are_skipped():
+    async def scenario():
+        broker = PostgresBroker(pool=None, conninfo="")
+        delivered = []
+
+        async def deliver(user_id, message):
+            delivered.append((user_id, message))
+
+        broker._deliver = deliver
+        for raw in (
+            "not json",
+            "[1, 2]",
+            json.dumps({"origin": "other", "user_id": "u"}),
+            json.dumps({"origin": broker.worker_id, "user_id": "u", "message": "own"}),
+            json.dumps({"origin": "other", "user_id": "u", "message": "hi"}),
+        ):
+            await broker._handle(raw)
+        return delivered
+
+    assert asyncio.run(scenario()) == [("u", "hi")]
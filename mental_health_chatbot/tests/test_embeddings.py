@@ -0,0 +1,101 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core.embeddings import EmbeddingService
+
+
+class FakeEmbeddings(EmbeddingService):
+    """Embeds text as [len(text)]; ``gate`` holds every batch until it is set."""
+
+    def __init__(self, **kwargs):
+        options = dict(model_name="fake", batch_size=8, batch_wait=0.01, cache_size=100, threads=1)
+        options.update(kwargs)
+        super().__init__(**options)
+        self.gate = threading.Event()
+        self.gate.set()
+        self.calls = []
+
+    def _embed_batch(self, texts):
+        self.gate.wait(5)
+        self.calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+
+def test_concurrent_callers_share_one_batch():
+    async def scenario():
+        service = FakeEmbeddings()
+        results = await asyncio.gather(
+            service.aembed_documents(["a", "bb"]),
+            service.aembed_documents(["bb", "ccc"]),
+            service.aembed_query("a"),
+        )
+        return service, results
+
+    service, results = asyncio.run(scenario())
+    assert results == [[[1.0], [2.0]], [[2.0], [3.0]], [1.0]]
+    # One forward pass, each distinct text once
+    assert service.calls == [["a", "bb", "ccc"]]
+
+
+def test_full_batch_flushes_without_waiting():
+    async def scenario():
+        service = FakeEmbeddings(batch_size=2, batch_wait=60)
+        return service, await asyncio.wait_for(service.aembed_documents(["a", "bb"]), 5)
+
+    service, vectors = asyncio.run(scenario())
+    assert vectors == [[1.0], [2.0]]
+    assert service.calls == [["a", "bb"]]
+
+
+def test_cache_skips_the_model():
+    async def scenario():
+        service = FakeEmbeddings()
+        await service.aembed_documents(["a"])
+        await service.aembed_documents(["a"])
+        return service
+
+    service = asyncio.run(scenario())
+    assert service.calls == [["a"]]
+    assert service.stats()["cache_hits"] == 1
+
+
+def test_cancelled_caller_does_not_cancel_others_waiting_on_the_same_text():
+    async def scenario():
+        service = FakeEmbeddings()
+        service.gate.clear()
+        a = asyncio.create_task(service.aembed_query("shared"))
+        b = asyncio.create_task(service.aembed_query("shared"))
+        await asyncio.sleep(0.05)  # batch is running, blocked on the gate
+        a.cancel()
+        await asyncio.sleep(0)
+        # Arrives after the cancellation, while the batch is still running
+        late = asyncio.create_task(service.aembed_query("shared"))
+        await asyncio.sleep(0)
+        service.gate.set()
+        with pytest.raises(asyncio.CancelledError):
+            await a
+        return await b, await late, service
+
+    b, late, service = asyncio.run(scenario())
+    assert b == late == [6.0]
+    assert service.calls == [["shared"]]
+    assert not service._inflight
+
+
+def test_batch_failure_reaches_every_caller():
+    class Broken(FakeEmbeddings):
+        def _embed_batch(self, texts):
+            raise RuntimeError("model down")
+
+    async def scenario():
+        service = Broken()
+        results = await asyncio.gather(
+            service.aembed_query("x"), service.aembed_query("x"), return_exceptions=True
+        )
+        return service, results
+
+    service, results = asyncio.run(scenario())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert not service._inflight
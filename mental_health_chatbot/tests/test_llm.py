@@ -0,0 +1,202 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from app.core.config import settings
+from app.core.llm import (
+    BACKGROUND,
+    INTERACTIVE,
+    LLMRegistry,
+    PrioritySemaphore,
+    RateLimitTracker,
+    parse_count,
+)
+
+
+class ProviderError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class ScriptedModel:
+    """Plays back ``script``: an exception is raised, anything else is the reply."""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = 0
+
+    async def ainvoke(self, input):
+        self.calls += 1
+        step = self.script.pop(0)
+        if isinstance(step, Exception):
+            raise step
+        return AIMessage(content=step)
+
+    async def astream(self, input):
+        self.calls += 1
+        for step in self.script.pop(0):
+            if isinstance(step, Exception):
+                raise step
+            yield AIMessageChunk(content=step)
+
+
+def registry(**models) -> LLMRegistry:
+    llm = LLMRegistry(
+        max_concurrency=4,
+        per_user_concurrency=2,
+        max_connections=4,
+        max_keepalive=4,
+        keepalive_expiry=1,
+        timeout=1,
+    )
+    for name, model in models.items():
+        llm.set_model(model, name)
+    return llm
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MODEL", "primary")
+    monkeypatch.setattr(settings, "LLM_FALLBACK_MODEL", "fallback")
+    monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 2)
+    monkeypatch.setattr(settings, "LLM_RETRY_BASE_DELAY", 0)
+    monkeypatch.setattr(settings, "LLM_HEDGE_AFTER", 0)
+
+
+def test_semaphore_wakes_by_priority_then_fifo():
+    async def scenario():
+        semaphore = PrioritySemaphore(1)
+        await semaphore.acquire()
+        order = []
+
+        async def waiter(name, priority):
+            await semaphore.acquire(priority)
+            order.append(name)
+            semaphore.release()
+
+        tasks = [
+            asyncio.create_task(waiter("background", BACKGROUND)),
+            asyncio.create_task(waiter("first", INTERACTIVE)),
+            asyncio.create_task(waiter("second", INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        semaphore.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["first", "second", "background"]
+
+
+def test_cancelled_waiter_does_not_lose_the_slot():
+    async def scenario():
+        semaphore = PrioritySemaphore(1)
+        await semaphore.acquire()
+        cancelled = asyncio.create_task(semaphore.acquire())
+        await asyncio.sleep(0)
+        # Woken and cancelled in the same step: the slot must be passed on
+        semaphore.release()
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        await asyncio.wait_for(semaphore.acquire(), 1)
+        return semaphore.waiting
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        semaphore = PrioritySemaphore(0)
+        waiter = asyncio.create_task(semaphore.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return semaphore.waiting
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_malformed_rate_limit_headers_are_skipped():
+    class Response:
+        status_code = 200
+        headers = {
+            "x-ratelimit-remaining-requests": "12",
+            "x-ratelimit-remaining-tokens": "lots",
+        }
+
+    tracker = RateLimitTracker()
+    asyncio.run(tracker.on_response(Response()))
+    assert tracker.remaining_requests == 12
+    assert tracker.remaining_tokens is None
+    assert parse_count(None) is None
+
+
+def test_retries_then_succeeds():
+    primary = ScriptedModel(ProviderError(503), ProviderError(429), "ok")
+    llm = registry(primary=primary)
+    reply = asyncio.run(llm.ainvoke("hi", user_id="u"))
+    assert reply.content == "ok"
+    assert primary.calls == 3
+    assert llm.retries == 2
+
+
+def test_falls_back_once_retries_are_exhausted():
+    primary = ScriptedModel(*[ProviderError(503)] * 3)
+    fallback = ScriptedModel("from fallback")
+    llm = registry(primary=primary, fallback=fallback)
+    reply = asyncio.run(llm.ainvoke("hi", user_id="u"))
+    assert reply.content == "from fallback"
+    assert llm.fallbacks == 1
+
+
+def test_client_errors_are_not_retried():
+    primary = ScriptedModel(ProviderError(400))
+    fallback = ScriptedModel("unused")
+    llm = registry(primary=primary, fallback=fallback)
+    with pytest.raises(ProviderError):
+        asyncio.run(llm.ainvoke("hi", user_id="u"))
+    assert primary.calls == 1
+    assert fallback.calls == 0
+
+
+def test_stream_is_not_retried_after_the_first_token():
+    primary = ScriptedModel(["partial", ProviderError(503)], ["again"])
+    fallback = ScriptedModel(["unused"])
+    llm = registry(primary=primary, fallback=fallback)
+    with pytest.raises(ProviderError):
+        asyncio.run(llm.ainvoke("hi", user_id="u", stream=True))
+    assert primary.calls == 1
+    assert fallback.calls == 0
+
+
+def test_stream_is_retried_before_the_first_token():
+    primary = ScriptedModel([ProviderError(503)], ["hel", "lo"])
+    llm = registry(primary=primary)
+    reply = asyncio.run(llm.ainvoke("hi", user_id="u", stream=True))
+    assert reply.content == "hello"
+
+
+def test_cancelled_hedged_call_cancels_the_request(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_AFTER", 10)
+    request_cancelled = []
+
+    class SlowModel:
+        async def ainvoke(self, input):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                request_cancelled.append(True)
+                raise
+
+    async def scenario():
+        llm = registry(primary=SlowModel())
+        call = asyncio.create_task(llm.ainvoke("hi", user_id="u", hedge=True))
+        await asyncio.sleep(0.01)
+        call.cancel()
+        await asyncio.gather(call, return_exceptions=True)
+        await asyncio.sleep(0)
+        # Checked before asyncio.run cancels whatever is left over
+        return list(request_cancelled)
+
+    assert asyncio.run(scenario()) == [True]
@@ -0,0 +1,110 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.store.memory import InMemoryStore
+
+from app.core.chatbot.chatbot_workflow import split_unprocessed
+from app.core.chatbot.memory import (
+    get_cursor,
+    load_memory,
+    memory_namespace,
+    merge_memories,
+    save_cursor,
+)
+from app.core.config import settings
+
+
+def conversation(turns: int):
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"user {i}", id=f"h{i}"))
+        messages.append(AIMessage(content=f"bot {i}", id=f"a{i}"))
+    return messages
+
+
+def test_split_without_cursor_treats_everything_as_new():
+    messages = conversation(2)
+    context, new = split_unprocessed(messages, None)
+    assert context == []
+    assert new == messages
+
+
+def test_split_after_cursor_with_context_window(monkeypatch):
+    monkeypatch.setattr(settings, "MEMORY_CONTEXT_MESSAGES", 2)
+    messages = conversation(3)
+    context, new = split_unprocessed(messages, "a1")
+    assert [m.id for m in context] == ["h1", "a1"]
+    assert [m.id for m in new] == ["h2", "a2"]
+
+
+def test_split_context_is_clipped_at_the_start(monkeypatch):
+    monkeypatch.setattr(settings, "MEMORY_CONTEXT_MESSAGES", 10)
+    messages = conversation(2)
+    context, new = split_unprocessed(messages, "h0")
+    assert [m.id for m in context] == ["h0"]
+    assert [m.id for m in new] == ["a0", "h1", "a1"]
+
+
+def test_split_at_newest_message_has_nothing_new():
+    messages = conversation(2)
+    _, new = split_unprocessed(messages, "a1")
+    assert new == []
+
+
+def test_split_with_trimmed_cursor_treats_everything_as_new():
+    messages = conversation(2)
+    context, new = split_unprocessed(messages, "summarized-away")
+    assert context == []
+    assert new == messages
+
+
+def test_merge_replaces_scalars_and_adds_keys():
+    merged = merge_memories({"Mood": "tired", "Name": "Sam"}, {"Mood": "calm", "Goal": "sleep"})
+    assert merged == {"Mood": "calm", "Name": "Sam", "Goal": "sleep"}
+
+
+def test_merge_unions_lists_without_duplicates():
+    merged = merge_memories({"Coping": ["walks", "music"]}, {"Coping": ["music", "journaling"]})
+    assert merged == {"Coping": ["walks", "music", "journaling"]}
+
+
+def test_merge_promotes_scalar_to_list():
+    assert merge_memories({"Coping": "walks"}, {"Coping": ["music"]}) == {
+        "Coping": ["walks", "music"]
+    }
+    assert merge_memories({"Coping": ["walks"]}, {"Coping": "music"}) == {
+        "Coping": ["walks", "music"]
+    }
+
+
+def test_merge_recurses_into_objects():
+    merged = merge_memories(
+        {"Family": {"Sister": "Ana", "Pets": ["cat"]}},
+        {"Family": {"Brother": "Leo", "Pets": ["dog"]}},
+    )
+    assert merged == {"Family": {"Sister": "Ana", "Brother": "Leo", "Pets": ["cat", "dog"]}}
+
+
+def test_merge_does_not_mutate_inputs():
+    existing = {"Coping": ["walks"], "Family": {"Sister": "Ana"}}
+    merge_memories(existing, {"Coping": ["music"], "Family": {"Brother": "Leo"}})
+    assert existing == {"Coping": ["walks"], "Family": {"Sister": "Ana"}}
+
+
+def test_load_memory_accepts_both_storage_shapes():
+    assert load_memory({"data": '{"Mood": "calm"}'}) == {"Mood": "calm"}
+    assert load_memory('{"Mood": "calm"}') == {"Mood": "calm"}
+    assert load_memory({"data": "not json"}) == {}
+    assert load_memory({"data": "[1, 2]"}) == {}
+
+
+def test_cursor_is_kept_in_the_store_apart_from_memories():
+    async def scenario():
+        store = InMemoryStore()
+        assert await get_cursor(store, "u", "t") is None
+        await save_cursor(store, "u", "t", "a1")
+        return await get_cursor(store, "u", "t"), await store.asearch(memory_namespace("u"))
+
+    cursor, memories = asyncio.run(scenario())
+    assert cursor == "a1"
+    assert memories == []
@@ -0,0 +1,81 @@
+import asyncio
+
+from langgraph.store.base import Item
+from langgraph.store.memory import InMemoryStore
+
+from app.core.chatbot import memory
+from app.core.chatbot.memory import save_memory, search_memories
+from app.core.chatbot.memory_cache import MemoryCache
+
+NS = ("memories", "u")
+
+
+def item(key: str, data: str = "{}") -> Item:
+    return Item(
+        value={"data": data},
+        key=key,
+        namespace=NS,
+        created_at="2025-01-01T00:00:00+00:00",
+        updated_at="2025-01-01T00:00:00+00:00",
+    )
+
+
+def test_result_read_before_an_invalidation_is_not_cached():
+    cache = MemoryCache(max_bytes=10_000, ttl=60)
+    generation = cache.generation(NS)
+    cache.invalidate(NS)
+    cache.set(NS, "", [item("old")], generation)
+    assert cache.get(NS) is None
+    assert cache.stats()["stale"] == 1
+
+    cache.set(NS, "", [item("new")], cache.generation(NS))
+    assert [i.key for i in cache.get(NS)] == ["new"]
+
+
+def test_invalidate_drops_every_key_of_the_namespace():
+    cache = MemoryCache(max_bytes=10_000, ttl=60)
+    cache.set(NS, "", [item("a")])
+    cache.set(NS, "query", [item("a")])
+    cache.set(("memories", "other"), "", [item("b")])
+    cache.invalidate(NS)
+    assert cache.get(NS) is None
+    assert cache.get(NS, "query") is None
+    assert cache.get(("memories", "other")) is not None
+
+
+def test_evicts_least_recently_used_past_the_byte_budget():
+    cache = MemoryCache(max_bytes=1500, ttl=60)
+    cache.set(NS, "a", [item("a", "x" * 400)])
+    cache.set(NS, "b", [item("b", "x" * 400)])
+    cache.get(NS, "a")
+    cache.set(NS, "c", [item("c", "x" * 400)])
+    assert cache.get(NS, "b") is None
+    assert cache.get(NS, "a") is not None
+    assert cache.bytes <= cache.max_bytes
+
+
+def test_save_during_search_is_not_hidden_by_the_cache(monkeypatch):
+    cache = MemoryCache(max_bytes=10_000, ttl=60)
+    monkeypatch.setattr(memory, "memory_cache", cache)
+
+    class RacingStore(InMemoryStore):
+        """Lands a save between the search reading the store and caching it."""
+
+        racing = True
+
+        async def asearch(self, *args, **kwargs):
+            results = await super().asearch(*args, **kwargs)
+            if self.racing:
+                self.racing = False
+                await save_memory(self, "u", "t", {"Mood": "calm"})
+            return results
+
+    async def scenario():
+        store = RacingStore()
+        first = await search_memories(store, "u", "hi")
+        second = await search_memories(store, "u", "hi")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == []
+    assert [i.key for i in second] == ["t"]
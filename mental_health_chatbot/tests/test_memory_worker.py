@@ -0,0 +1,61 @@
+import asyncio
+
+from app.core.chatbot.memory_worker import MemoryExtractionQueue
+
+
+def config(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id, "user_id": "u"}}
+
+
+def test_thread_is_never_processed_by_two_workers_at_once(monkeypatch):
+    async def scenario():
+        queue = MemoryExtractionQueue(maxsize=10, workers=3)
+        running = set()
+        overlaps = []
+        runs = []
+        release = asyncio.Event()
+
+        async def process(thread_id, _config):
+            if thread_id in running:
+                overlaps.append(thread_id)
+            running.add(thread_id)
+            runs.append(thread_id)
+            await release.wait()
+            running.discard(thread_id)
+
+        monkeypatch.setattr(queue, "_process", process)
+        queue.start(graph=None)
+        queue.submit(config("t"))
+        await asyncio.sleep(0.01)
+        # Submitted twice while the first run is still going: one rerun
+        queue.submit(config("t"))
+        queue.submit(config("t"))
+        await asyncio.sleep(0.01)
+        assert runs == ["t"]
+        release.set()
+        await queue.stop(timeout=1)
+        return runs, overlaps, queue.stats()
+
+    runs, overlaps, stats = asyncio.run(scenario())
+    assert runs == ["t", "t"]
+    assert overlaps == []
+    assert stats["processed"] == 2
+    assert stats["coalesced"] == 1
+
+
+def test_queued_thread_is_coalesced(monkeypatch):
+    async def scenario():
+        queue = MemoryExtractionQueue(maxsize=10, workers=1)
+        runs = []
+
+        async def process(thread_id, _config):
+            runs.append(thread_id)
+
+        monkeypatch.setattr(queue, "_process", process)
+        for thread_id in ("a", "a", "b", "a"):
+            queue.submit(config(thread_id))
+        queue.start(graph=None)
+        await queue.stop(timeout=1)
+        return runs
+
+    assert asyncio.run(scenario()) == ["a", "b"]
@@ -0,0 +1,28 @@
+from langchain_core.messages import HumanMessage
+from langgraph.store.base import Item
+
+from app.core.chatbot.prompts import MEMORY_HEADER, STATIC_SYSTEM_MESSAGE, PromptAssembler
+
+
+def memory(key: str, data: str) -> Item:
+    return Item(
+        value={"data": data},
+        key=key,
+        namespace=("memories", "u"),
+        created_at="2025-01-01T00:00:00+00:00",
+        updated_at="2025-01-01T00:00:00+00:00",
+    )
+
+
+def test_memory_header_travels_with_the_memories():
+    assert MEMORY_HEADER
+    assert MEMORY_HEADER not in STATIC_SYSTEM_MESSAGE.content
+    assert "{info}" not in STATIC_SYSTEM_MESSAGE.content
+
+    assembler = PromptAssembler()
+    question = HumanMessage(content="hi")
+    without = assembler.assemble("u", [], [question])
+    assert without == [STATIC_SYSTEM_MESSAGE, question]
+
+    prompt = assembler.assemble("u", [memory("t", '{"Mood": "calm"}')], [question])
+    assert prompt[1].content == f'{MEMORY_HEADER}\n\n{{"Mood": "calm"}}'
@@ -0,0 +1,49 @@
+import asyncio
+
+from app.core import ratelimit
+from app.core.ratelimit import InMemoryRateLimiter, guest_limit_key, sliding_count
+
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+def test_sliding_count_weights_the_previous_window():
+    assert sliding_count(10, 2, window=60, now=600) == 12
+    assert sliding_count(10, 2, window=60, now=630) == 7
+    assert sliding_count(10, 2, window=60, now=659.9) < 2.1
+
+
+def test_limit_carries_over_the_window_boundary(monkeypatch):
+    clock = Clock(1000 * 60 + 50)
+    monkeypatch.setattr(ratelimit.time, "time", clock.time)
+
+    async def scenario():
+        limiter = InMemoryRateLimiter(limit=3, window=60)
+        allowed = [await limiter.hit("k") for _ in range(3)]
+        # A fixed window would reset here; the sliding one still counts ~3
+        clock.now += 15
+        allowed.append(await limiter.hit("k"))
+        # Most of the previous window has slid out
+        clock.now += 50
+        allowed.append(await limiter.hit("k"))
+        return allowed
+
+    assert asyncio.run(scenario()) == [True, True, True, False, True]
+
+
+def test_keys_are_limited_independently():
+    async def scenario():
+        limiter = InMemoryRateLimiter(limit=1, window=60)
+        return [await limiter.hit(key) for key in ("a", "b", "a")]
+
+    assert asyncio.run(scenario()) == [True, True, False]
+
+
+def test_guest_limit_key_ignores_the_date():
+    assert guest_limit_key("guest-1.2.3.4-20250101") == guest_limit_key("guest-1.2.3.4-20250102")
+    assert guest_limit_key("guest-1.2.3.4-20250101") != guest_limit_key("guest-5.6.7.8-20250101")
@@ -0,0 +1,68 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.core.chatbot.response_cache import ResponseCache, is_crisis, normalize
+
+VECTORS = {
+    "hi there": [1.0, 0.0],
+    "hello there": [0.99, 0.14],
+    "i feel anxious": [0.0, 1.0],
+}
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResponseCache(enabled=True, max_entries=10, ttl=60, threshold=0.95)
+    cache.embedded = []
+
+    async def embed(text):
+        cache.embedded.append(text)
+        vector = np.asarray(VECTORS.get(normalize(text), [0.7, 0.7]), dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    monkeypatch.setattr(cache, "_embed", embed)
+    return cache
+
+
+def test_exact_and_semantic_hits(cache):
+    async def scenario():
+        await cache.store("Hi there!", "Hello! How are you feeling today?")
+        return (
+            await cache.lookup("hi   THERE"),
+            await cache.lookup("hello there"),
+            await cache.lookup("I feel anxious"),
+        )
+
+    exact, similar, unrelated = asyncio.run(scenario())
+    assert exact == similar == "Hello! How are you feeling today?"
+    assert unrelated is None
+    assert cache.stats()["exact_hits"] == 1
+    assert cache.stats()["semantic_hits"] == 1
+
+
+@pytest.mark.parametrize(
+    "message",
+    ["I want to die", "thinking about self-harm", "I feel hopeless", "I'm SUICIDAL"],
+)
+def test_crisis_messages_bypass_the_cache(cache, message):
+    assert is_crisis(message)
+
+    async def scenario():
+        await cache.store(message, "cached reply")
+        return await cache.lookup(message)
+
+    assert asyncio.run(scenario()) is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["crisis_bypassed"] == 1
+    # Never even embedded, so nothing about it leaves the request
+    assert cache.embedded == []
+
+
+def test_reply_raising_safety_topics_is_not_reused(cache):
+    async def scenario():
+        await cache.store("hi there", "If this is an emergency, press the therapist button.")
+        return await cache.lookup("hi there")
+
+    assert asyncio.run(scenario()) is None
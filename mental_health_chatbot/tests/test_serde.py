@@ -0,0 +1,52 @@
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.db.serde import COMPRESSED, CompressingSerializer, SerdeStats, measure_turn
+
+
+def history(turns: int):
+    return {
+        "messages": [
+            message
+            for i in range(turns)
+            for message in (
+                HumanMessage(content=f"I have had a long week at work, day {i}.", id=f"h{i}"),
+                AIMessage(content="That sounds exhausting. What weighed on you most?", id=f"a{i}"),
+            )
+        ],
+        "summary": "The user has been stressed by deadlines.",
+    }
+
+
+def test_large_values_are_compressed_and_round_trip():
+    serde = CompressingSerializer(min_bytes=256)
+    value = history(50)
+    type_, data = serde.dumps_typed(value)
+    assert type_ == COMPRESSED
+    assert serde.loads_typed((type_, data)) == value
+
+
+def test_small_values_stay_plain_msgpack():
+    serde = CompressingSerializer(min_bytes=1 << 20)
+    value = history(1)
+    type_, data = serde.dumps_typed(value)
+    assert type_ == "msgpack"
+    assert serde.loads_typed((type_, data)) == value
+
+
+def test_negative_threshold_disables_compression_but_still_reads_it():
+    value = history(50)
+    compressed = CompressingSerializer(min_bytes=0).dumps_typed(value)
+    plain = CompressingSerializer(min_bytes=-1)
+    assert plain.dumps_typed(value)[0] == "msgpack"
+    assert plain.loads_typed(compressed) == value
+
+
+def test_measure_turn_counts_only_its_own_work():
+    serde = CompressingSerializer(min_bytes=0)
+    serde.dumps_typed(history(5))
+    with measure_turn() as stats:
+        type_, data = serde.dumps_typed(history(5))
+        serde.loads_typed((type_, data))
+    assert isinstance(stats, SerdeStats)
+    assert stats.encoded == 1 and stats.decoded == 1
+    assert stats.stored_bytes == 2 * len(data)
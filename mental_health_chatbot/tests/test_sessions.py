@@ -0,0 +1,115 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.core.sessions import (
+    THREAD_LOCK_CLASS,
+    ThreadLocks,
+    generate_thread_id,
+    owns_thread,
+)
+
+
+def test_pending_counts_holders_and_waiters():
+    async def scenario():
+        locks = ThreadLocks()
+        release = asyncio.Event()
+        counts = []
+
+        async def turn():
+            async with locks.hold("t"):
+                await release.wait()
+
+        tasks = [asyncio.create_task(turn()) for _ in range(3)]
+        await asyncio.sleep(0)
+        counts.append(locks.pending("t"))
+        counts.append(locks.pending("other"))
+        release.set()
+        await asyncio.gather(*tasks)
+        counts.append(locks.pending("t"))
+        return counts, len(locks)
+
+    counts, remaining = asyncio.run(scenario())
+    assert counts == [3, 0, 0]
+    assert remaining == 0
+
+
+def test_cancelled_waiter_is_not_counted():
+    async def scenario():
+        locks = ThreadLocks()
+        release = asyncio.Event()
+
+        async def turn():
+            async with locks.hold("t"):
+                await release.wait()
+
+        holder = asyncio.create_task(turn())
+        waiter = asyncio.create_task(turn())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        pending = locks.pending("t")
+        release.set()
+        await holder
+        return pending
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_owns_thread():
+    thread_id = generate_thread_id("alice")
+    assert owns_thread("alice", thread_id)
+    assert owns_thread("alice", "alice-20250101120000")
+    assert not owns_thread("bob", thread_id)
+    assert not owns_thread("alice", "alice")
+    assert not owns_thread("alice", "alice-anything")
+    # "alice" must not own the threads of a user called "alice-bob"
+    assert not owns_thread("alice", generate_thread_id("alice-bob"))
+    assert not owns_thread("alice-bob", thread_id)
+
+
+class FakeConnection:
+    def __init__(self, log):
+        self.log = log
+
+    @asynccontextmanager
+    async def transaction(self):
+        self.log.append("begin")
+        try:
+            yield
+        except BaseException:
+            self.log.append("rollback")
+            raise
+        self.log.append("commit")
+
+    async def execute(self, query, params):
+        self.log.append((query, params))
+
+
+class FakePool:
+    max_size = 4
+
+    def __init__(self):
+        self.log = []
+
+    @asynccontextmanager
+    async def connection(self):
+        yield FakeConnection(self.log)
+
+
+def test_hold_takes_advisory_lock_with_a_pool():
+    async def scenario():
+        locks = ThreadLocks()
+        pool = FakePool()
+        locks.use_pool(pool)
+        async with locks.hold("t"):
+            pool.log.append("turn")
+        with pytest.raises(RuntimeError):
+            async with locks.hold("t"):
+                raise RuntimeError
+        return pool.log
+
+    log = asyncio.run(scenario())
+    lock = ("SELECT pg_advisory_xact_lock(%s, hashtext(%s))", (THREAD_LOCK_CLASS, "t"))
+    assert log == ["begin", lock, "turn", "commit", "begin", lock, "rollback"]
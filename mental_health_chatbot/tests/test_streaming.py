@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from app.core.encoding import loads
+from app.core.streaming import DeltaSender
+
+
+class SlowReader:
+    """Records frames; each send blocks until the test lets it through."""
+
+    def __init__(self):
+        self.frames = []
+        self.gate = asyncio.Semaphore(0)
+
+    async def send(self, frame, websocket):
+        await self.gate.acquire()
+        self.frames.append(loads(frame)["content"])
+
+
+def test_tokens_coalesce_while_the_reader_is_slow():
+    async def scenario():
+        reader = SlowReader()
+        sender = DeltaSender(websocket=None, send=reader.send)
+        sender.push("Hel")
+        await asyncio.sleep(0)
+        # The first frame is in flight; these pile up behind it
+        for token in ("lo", ", ", "there"):
+            sender.push(token)
+        reader.gate.release()
+        await asyncio.sleep(0)
+        sender.push("!")
+        for _ in range(3):
+            reader.gate.release()
+        await asyncio.wait_for(sender.aclose(), 1)
+        return reader.frames
+
+    frames = asyncio.run(scenario())
+    assert "".join(frames) == "Hello, there!"
+    assert frames[0] == "Hel"
+    assert len(frames) < 5
+
+
+def test_dead_socket_surfaces_on_push():
+    async def scenario():
+        async def send(frame, websocket):
+            raise ConnectionResetError
+
+        sender = DeltaSender(websocket=None, send=send)
+        sender.push("a")
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        with pytest.raises(ConnectionResetError):
+            sender.push("b")
+
+    asyncio.run(scenario())
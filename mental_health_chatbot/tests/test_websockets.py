@@ -0,0 +1,43 @@
+import asyncio
+
+from app.core.websockets import ConnectionManager
+
+
+class Socket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+    async def close(self, code):
+        pass
+
+
+class StalledSocket(Socket):
+    """A peer that stopped reading: sends and closes never complete."""
+
+    async def send_text(self, text):
+        await asyncio.Event().wait()
+
+    async def close(self, code):
+        await asyncio.Event().wait()
+
+
+def test_stalled_peer_does_not_block_the_sweep():
+    async def scenario():
+        manager = ConnectionManager(heartbeat_interval=0, idle_timeout=60)
+        manager.SEND_TIMEOUT = 0.05
+        healthy = Socket()
+        await manager.connect(StalledSocket(), "a")
+        await manager.connect(healthy, "b")
+        await asyncio.wait_for(manager.reap(), 1)
+        return manager, healthy
+
+    manager, healthy = asyncio.run(scenario())
+    assert healthy.sent
+    assert len(manager) == 1
+    assert manager.stats()["reaped"] == 1